@@ -0,0 +1,66 @@
+# ===========================================================================
+#  This file is part of the Tango Ecosystem
+#
+#  Copyright 2017-EOT Synchrotron SOLEIL, St.Aubin, France
+#
+#  This is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Lesser General Public License as published by the Free
+#  Software Foundation, either version 3 of the License, or (at your option)
+#  any later version.
+#
+#  This is distributed in the hope that it will be useful, but WITHOUT ANY
+#  WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for
+#  more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with This.  If not, see <http://www.gnu.org/licenses/>.
+# ===========================================================================
+
+"""import time regression check: exits with a non-zero status if importing a module exceeds its budget
+
+usage (from the repository root): python -m common.check_import_time [--runs N] [module=max_seconds ...]
+"""
+
+from __future__ import print_function
+import argparse
+import sys
+
+from common.tools import import_time
+
+# default budgets (in seconds) - the heavy dependencies (bokeh server, ipywidgets, PIL, ...) must remain lazy
+default_budgets = [
+    ('common.processing', 0.5),
+    ('common.session', 3.0),
+    ('common.plots', 4.0),
+]
+
+
+# ------------------------------------------------------------------------------
+def parse_budget(arg):
+    module_name, _, max_time = arg.partition('=')
+    if not module_name or not max_time:
+        raise argparse.ArgumentTypeError("expected module=max_seconds, got '{}'".format(arg))
+    return module_name, float(max_time)
+
+
+# ------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="check the import time of the package modules")
+    parser.add_argument('--runs', type=int, default=3, help="num. of imports per module (the best one is kept)")
+    parser.add_argument('budgets', nargs='*', type=parse_budget, help="module=max_seconds (defaults to the modules "
+                                                                      "of this package)")
+    args = parser.parse_args(argv)
+    failures = 0
+    for module_name, max_time in (args.budgets or default_budgets):
+        try:
+            dt = import_time(module_name, runs=args.runs, max_time=max_time)
+            print("ok: {} imported in {:.3f} s (max. {:.3f} s)".format(module_name, dt, max_time))
+        except Exception as e:
+            failures += 1
+            print("FAILED: {}".format(e))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -52,6 +52,8 @@ class ChannelData(object):
         self._has_failed = False
         # has new data (updated since last read)
         self.has_been_updated = False
+        # rows [start, end) updated since last read (e.g. scanners) - None means 'unknown' (i.e. whole buffer)
+        self._updated_rows = None
         # error txt
         self._error = "no error"
         # exception caught
@@ -109,11 +111,20 @@ class ChannelData(object):
     def time_buffer(self):
         return self._time_buffer
 
-    def set_data(self, data_buffer, time_buffer=None, format=None):
+    @property
+    def updated_rows(self):
+        return self._updated_rows
+
+    def set_data(self, data_buffer, time_buffer=None, format=None, updated_rows=None):
+        """updated_rows: optional (start, end) rows range - tells the consumers that only these rows changed
+
+        the data buffer is not copied: the consumers get a reference to it (no need to copy it before handing it over)
+        """
         assert (isinstance(data_buffer, np.ndarray))
         self._buffer = data_buffer
         self._time_buffer = time_buffer
         self._format = format
+        self._updated_rows = tuple(updated_rows) if updated_rows is not None else None
         self.has_been_updated = True
         self.reset_error()
 
@@ -132,6 +143,7 @@ class ChannelData(object):
     def __reset_data(self):
         self._buffer = None
         self._time_buffer = None
+        self._updated_rows = None
         self._has_been_updated = False
         
 
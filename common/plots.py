@@ -20,8 +20,10 @@
 from __future__ import print_function
 
 import datetime
+import time
 from collections import OrderedDict, deque
 from math import ceil, pi
+from threading import Lock
 import six
 
 import math as mt
@@ -29,8 +31,6 @@ import numpy as np
 
 from IPython.display import display
 
-import ipywidgets as ipw
-
 from bokeh.layouts import row, column, layout, gridplot
 from bokeh.models import ColumnDataSource, CustomJS, DatetimeTickFormatter, Label
 from bokeh.models import widgets as BokehWidgets
@@ -40,8 +40,7 @@ from bokeh.models.ranges import Range1d
 from bokeh.models.tools import BoxSelectTool, HoverTool, CrosshairTool
 from bokeh.models.tools import ResetTool, PanTool, BoxZoomTool
 from bokeh.models.tools import WheelZoomTool, SaveTool
-from bokeh.models.widgets.markups import Div
-from bokeh.palettes import Plasma256
+from bokeh.palettes import Plasma256, Viridis256
 from bokeh.plotting import figure
 from bokeh.plotting.figure import Figure
 import bokeh.events
@@ -49,9 +48,8 @@ import bokeh.events
 
 from common.tools import *
 from common.datasource import *
+from common.processing import *
 from common.session import BokehSession
-        
-from skimage.transform import rescale
 
 plots_module_logger_name = "fs.client.jupyter.plots"
 
@@ -213,6 +211,8 @@ class Channel(NotebookCellContent, DataStreamEventHandler):
         self._model_props = dict() if model_properties is None else model_properties
         # tmp label
         self._msg_label = None
+        # time of the last update allowed by update_due
+        self._last_update_time = None
 
     def handle_stream_event(self, event):
         assert (isinstance(event, DataStreamEvent))
@@ -226,6 +226,43 @@ class Channel(NotebookCellContent, DataStreamEventHandler):
     def show_title(self):
         return self._model_props.get('show_channel_title', False)
 
+    @property
+    def update_period(self):
+        """returns the channel own update period (in seconds) or None (i.e. the one of its DataStream)"""
+        return self._model_props.get('update_period', None)
+
+    @update_period.setter
+    def update_period(self, up):
+        """set the channel own update period (in seconds) or None to use the one of its DataStream"""
+        self._model_props['update_period'] = up
+
+    @property
+    def hidden_update_period(self):
+        """returns the update period (in seconds) while the channel is not visible or None (i.e. no update)"""
+        return self._model_props.get('hidden_update_period', None)
+
+    @hidden_update_period.setter
+    def hidden_update_period(self, up):
+        """set the update period (in seconds) while the channel is not visible - None to suspend the updates"""
+        self._model_props['hidden_update_period'] = up
+
+    @property
+    def visible(self):
+        """returns False if the channel model is known to be out of the browser viewport, returns True otherwise"""
+        return self._session.is_visible(str(self.uid)) if self._session is not None else True
+
+    def update_due(self, now=None):
+        """returns True if the channel has to be updated (i.e. visible or hidden_update_period elapsed)"""
+        now = time.time() if now is None else now
+        if not self.visible:
+            hup = self.hidden_update_period
+            if hup is None:
+                return False
+            if self._last_update_time is not None and now - self._last_update_time < hup:
+                return False
+        self._last_update_time = now
+        return True
+
     @property
     def data_source(self):
         """returns the 'first' (and sometimes 'unique') data source"""
@@ -258,6 +295,11 @@ class Channel(NotebookCellContent, DataStreamEventHandler):
             for s in ds:
                 self.add_data_source(s)
 
+    def keep_warm(self):
+        """poll the data sources without updating the model (see BokehSession.keep_warm)"""
+        for dsi in self._data_sources.values():
+            dsi.pull_data()
+
     def get_data(self):
         """returns a dict containing the data of each data source"""
         data = dict()
@@ -312,6 +354,16 @@ class Channel(NotebookCellContent, DataStreamEventHandler):
         """asks the channel to setup then return its Bokeh associated model - returns None if no model"""
         return None
 
+    def pull_update(self):
+        """optional I/O phase of the next update: pulls the data sources on the calling (IOLoop) thread so that they
+        don't have to be thread safe (see LayoutChannel)"""
+        pass
+
+    def prepare_update(self):
+        """optional compute phase of the next update - must not modify the Bokeh document nor pull the data sources
+        (runs on a worker thread - see LayoutChannel)"""
+        pass
+
     def _show_msg_label(self, bkh_figure, x=70, y=70, text='Waiting for data'):
         self._msg_text = text
         self._msg_cnt = 0
@@ -363,6 +415,8 @@ class BoxSelectionManager(NotebookCellContent):
         self._selection_callback = selection_callback
         self._reset_callback = reset_callback
         self._selection_cds = self.__setup_selection_data_source()
+        # region of interest statistics providers: {name: callable(selection_range) -> dict or None}
+        self._statistics_providers = OrderedDict()
 
     def __del__(self):
         try:
@@ -418,6 +472,27 @@ class BoxSelectionManager(NotebookCellContent):
         rect = self.__selection_glyph()
         bkh_figure.add_glyph(self._selection_cds, glyph=rect, selection_glyph=rect, nonselection_glyph=rect)
 
+    def register_statistics_provider(self, name, provider):
+        """provider is called with the selection range and returns the selected region statistics (or None)"""
+        self._statistics_providers[name] = provider
+
+    def unregister_statistics_provider(self, name):
+        try:
+            del self._statistics_providers[name]
+        except KeyError:
+            pass
+
+    def __selection_statistics(self, selection_range):
+        statistics = dict()
+        for name, provider in self._statistics_providers.items():
+            try:
+                stats = provider(selection_range)
+                if stats is not None:
+                    statistics[name] = stats
+            except Exception as e:
+                self.error(e)
+        return statistics
+
     def __print_event(self, attributes=list()):
         def python_callback(event):
             cls_name = event.__class__.__name__
@@ -481,7 +556,10 @@ class BoxSelectionManager(NotebookCellContent):
     def on_selection_change(self, selection):
         try:
             if self._selection_callback:
-                self._selection_callback(self.__selection_range(selection))
+                selection_range = self.__selection_range(selection)
+                if self._statistics_providers:
+                    selection_range['statistics'] = self.__selection_statistics(selection_range)
+                self._selection_callback(selection_range)
         except Exception as e:
             self.error(e)
 
@@ -492,10 +570,29 @@ class BoxSelectionManager(NotebookCellContent):
 
 # ------------------------------------------------------------------------------
 class InteractionsManager(object):
-    def __init__(self):
+    """notifies its owner when the figure ranges change (pan, zoom, ...)
+
+    range change events are debounced: a burst of events leads to a single call to the owner's handler, with
+    the final ranges. The debouncing delay adapts to the time the handler actually takes and superseded
+    calls are cancelled. During long bursts (e.g. continuous pan), the handler is still called every
+    'max_delay' seconds.
+    """
+
+    def __init__(self, min_delay=0.05, max_delay=0.5):
         self._session = None
         self._callback = None
-        self._range_change_notified = False
+        # debouncing delay bounds (in seconds)
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+        # scheduled handler call (cancellable)
+        self._pending = None
+        # time at which the current burst of events started
+        self._burst_start = None
+        # is the owner's handler running? did the ranges change meanwhile?
+        self._handling = False
+        self._missed = False
+        # smoothed duration of the owner's handler (in seconds)
+        self._handler_duration = None
 
     def setup(self, session, figure, callback):
         assert (isinstance(session, BokehSession))
@@ -507,29 +604,69 @@ class InteractionsManager(object):
         figure.y_range.on_change('start', self.__on_range_change)
         figure.y_range.on_change('end', self.__on_range_change)
 
+    @property
+    def handler_duration(self):
+        """returns the (smoothed) duration of the owner's handler in seconds - None if unknown"""
+        return self._handler_duration
+
     def __on_reset(self, event):
         self.__notify_range_change()
 
     def __on_range_change(self, attr, old, new):
         self.__notify_range_change()
 
+    def __delay(self):
+        if self._handler_duration is None:
+            return 0.25
+        return min(self._max_delay, max(self._min_delay, 2. * self._handler_duration))
+
     def __notify_range_change(self):
-        if not self._range_change_notified and self._callback:
-            self._range_change_notified = True
-            try:
-                # -----------------------------------------------------------------------------
-                # InteractionsManager.__on_range_change is called with 'document' locked
-                # we consequently have to call the owner's handler asynchrounously so that
-                # it will be able to update the plot
-                # -----------------------------------------------------------------------------
-                # nb: this a tmp impl - we are waiting for the bokeh events to improve it
-                # -----------------------------------------------------------------------------
-                self._session.timeout_callback(self._callback, 0.25)
-            except Exception as e:
-                print(e)
+        if not self._callback:
+            return
+        if self._handling:
+            self._missed = True
+            return
+        now = time.time()
+        if self._pending is not None:
+            if now - self._burst_start >= self._max_delay:
+                # long burst: let the scheduled call happen (intermediate rendering)
+                return
+            # superseded: the handler will be called with the final ranges
+            self._session.remove_timeout_callback(self._pending)
+        else:
+            self._burst_start = now
+        try:
+            # -----------------------------------------------------------------------------
+            # InteractionsManager.__on_range_change is called with 'document' locked
+            # we consequently have to call the owner's handler asynchrounously so that
+            # it will be able to update the plot
+            # -----------------------------------------------------------------------------
+            self._pending = self._session.timeout_callback(self.__handle_range_change, self.__delay())
+        except Exception as e:
+            self._pending = None
+            print(e)
+
+    def __handle_range_change(self):
+        self._pending = None
+        self._handling = True
+        t0 = time.time()
+        try:
+            self._callback()
+        except Exception as e:
+            print(e)
+        finally:
+            dt = time.time() - t0
+            hd = self._handler_duration
+            self._handler_duration = dt if hd is None else 0.7 * hd + 0.3 * dt
+            self._handling = False
+        if self._missed:
+            # the ranges changed while the handler was running: make sure the final ranges are rendered
+            self._missed = False
+            self.__notify_range_change()
 
     def range_change_handled(self):
-        self._range_change_notified = False
+        """kept for backward compatibility: the end of the handler is now detected by the manager itself"""
+        pass
 
 
 # ------------------------------------------------------------------------------
@@ -907,6 +1044,10 @@ class SpectrumChannel(Channel):
         self._ysc = None  # y scale
         self._mdl = None  # model
         self._rdr = dict()  # renderers (i.e. y glyphs)
+        self._mlm = False  # multi-line mode (i.e. a single MultiLine glyph for all traces)
+        self._mlr = None  # multi-line renderer
+        self._mln = list()  # multi-line traces names (i.e. data sources names in rendering order)
+        self._acc = dict()  # frame accumulators (one per y data source - optional)
 
     def get_model(self):
         """returns the Bokeh model (figure, layout, ...) associated with the Channel or None if no model"""
@@ -921,6 +1062,25 @@ class SpectrumChannel(Channel):
             columns[cn] = np.zeros(1)
         return ColumnDataSource(data=columns)
 
+    def __instanciate_multi_line_data_source(self):
+        # one row per trace: the whole set of traces is drawn by a single MultiLine glyph
+        self._mln = [cn for cn in self.data_sources if cn != self._xsn]
+        columns = OrderedDict()
+        columns['xs'] = [np.zeros(1) for _ in self._mln]
+        columns['ys'] = [np.zeros(1) for _ in self._mln]
+        columns['name'] = list(self._mln)
+        columns['line_color'] = self.__traces_colors(len(self._mln))
+        columns['line_alpha'] = [1. for _ in self._mln]
+        return ColumnDataSource(data=columns)
+
+    @staticmethod
+    def __traces_colors(num_traces, palette=Viridis256):
+        # one distinct color per trace: the palette is sampled evenly (there's no legend in multi-line mode)
+        if num_traces < 2:
+            return list(palette[:num_traces])
+        step = (len(palette) - 1) / float(num_traces - 1)
+        return [palette[int(round(i * step))] for i in range(num_traces)]
+
     def __validate_x_channel(self):
         xsn = self._xsc.channel
         if self._xsc.type == ScaleType.CHANNEL and (xsn is None or not xsn in self.data_sources):
@@ -946,6 +1106,11 @@ class SpectrumChannel(Channel):
             ("index", "$index"),
             ("(x,y)", "($x, $y)")
         ]
+        if self._mlm:
+            htt = [
+                ("trace", "@name"),
+                ("(x,y)", "($x, $y)")
+            ]
         bkh_figure.add_tools(PanTool())
         bkh_figure.add_tools(BoxZoomTool())
         bkh_figure.add_tools(WheelZoomTool())
@@ -988,6 +1153,15 @@ class SpectrumChannel(Channel):
         kwargs['legend'] = None if not show_legend else y_column + ' '
         self._rdr[y_column] = bkh_figure.line(**kwargs)
 
+    def __setup_multi_line_glyph(self, bkh_figure):
+        kwargs = dict()
+        kwargs['xs'] = 'xs'
+        kwargs['ys'] = 'ys'
+        kwargs['source'] = self._cds
+        kwargs['line_color'] = 'line_color'
+        kwargs['line_alpha'] = 'line_alpha'
+        self._mlr = bkh_figure.multi_line(**kwargs)
+
     @tracer
     def setup_model(self, **kwargs):
         try:
@@ -1002,8 +1176,19 @@ class SpectrumChannel(Channel):
             self._ysc.validate()
             # if specified, x_channel must be one of our children
             self._xsn = self.__validate_x_channel()
+            # multi-line mode: pack all traces into a single MultiLine glyph (no legend in this mode)
+            self._mlm = props.get('multi_line', False)
+            # optional frame averaging/accumulation (one accumulator per y data source)
+            self._acc = dict()
+            for cn in self.data_sources:
+                acc = FrameAccumulator.from_properties(props) if cn != self._xsn else None
+                if acc is not None:
+                    self._acc[cn] = acc
             # instanciate the ColumnDataSource
-            self._cds = self.__instanciate_data_source()
+            if self._mlm:
+                self._cds = self.__instanciate_multi_line_data_source()
+            else:
+                self._cds = self.__instanciate_data_source()
             # setup figure
             show_title = True if len(self.data_sources) == 1 else False
             show_title = props.get('show_title', show_title)
@@ -1011,10 +1196,13 @@ class SpectrumChannel(Channel):
             f = self.__setup_figure(**props)
             # setup glyphs
             show_legend = False if len(self.data_sources) == 1 else True
-            show_legend = props.get('show_legend', show_legend)
-            for data_source in self.data_sources:
-                if data_source != self._xsn:
-                    self.__setup_glyph(f, data_source, show_legend)
+            show_legend = props.get('show_legend', show_legend) and not self._mlm
+            if self._mlm:
+                self.__setup_multi_line_glyph(f)
+            else:
+                for data_source in self.data_sources:
+                    if data_source != self._xsn:
+                        self.__setup_glyph(f, data_source, show_legend)
             # setup the legend
             if show_legend:
                 self.__setup_legend(f)
@@ -1076,10 +1264,13 @@ class SpectrumChannel(Channel):
                 except Exception:
                     updated_data[self._xsn] = np.zeros((min_len,), np.float)
                     self._mdl.x_range.update(start=0, end=0)
+            if self._mlm:
+                self.__update_multi_line(data, updated_data[self._xsn], min_len)
+                return
             for cn, ci in six.iteritems(self.data_sources):
                 try:
                     if cn != self._xsn:
-                        updated_data[cn] = data[cn].buffer[:min_len]
+                        updated_data[cn] = self.__accumulate(cn, data[cn])[:min_len]
                         self._rdr[cn].visible = True
                 except Exception:
                     updated_data[cn] = np.zeros((min_len,), np.float)
@@ -1088,6 +1279,24 @@ class SpectrumChannel(Channel):
         except Exception as e:
             self.error(e)
 
+    def __update_multi_line(self, data, x_scale_data, min_len):
+        # all traces share the same x scale data - failed traces are hidden through their alpha
+        xs, ys, alphas = list(), list(), list()
+        for cn in self._mln:
+            try:
+                ys.append(self.__accumulate(cn, data[cn])[:min_len])
+                alphas.append(1.)
+            except Exception:
+                ys.append(np.zeros((min_len,), np.float))
+                alphas.append(0.)
+            xs.append(x_scale_data)
+        self._cds.data.update(xs=xs, ys=ys, line_alpha=alphas)
+
+    def __accumulate(self, cn, sd):
+        # returns either the raw buffer or the accumulated one (i.e. running mean, sum or ewma)
+        acc = self._acc.get(cn, None)
+        return sd.buffer if acc is None else acc.push(sd.buffer)
+
     def cleanup(self):
         self.__reinitialize()
         super(SpectrumChannel, self).cleanup()
@@ -1097,12 +1306,53 @@ class SpectrumChannel(Channel):
 class ImageChannel(Channel):
     """image data source channel"""
 
+    # displayed when there's no valid image (shared and read-only: no allocation on error paths)
+    __nan_image__ = np.full((2, 2), np.nan)
+    __nan_image__.setflags(write=False)
+
     def __init__(self, name, data_source=None, model_properties=None):
         Channel.__init__(self, name, data_sources=[data_source], model_properties=model_properties)
         self.__reinitialize()
 
     def __reinitialize(self):
         self._sd = None  # last data receive from the associated source
+        self._frame = None  # last frame to display (i.e. self._sd.buffer or its accumulated counterpart)
+        self._acc = None  # frame accumulator (optional)
+        self._pyr = None  # multi-resolution image pyramid (optional)
+        self._extraction = None  # (ysi, yei, xsi, xei, rescaling factor) of the last extracted image
+        self._rgba = None  # server side colormapping (optional RgbaColorMapper)
+        self._tde = None  # dirty tiles delta encoder (optional)
+        self._tpc = None  # on-demand tiles pyramid (optional)
+        self._tcds = None  # tiles column data source
+        self._tird = None  # tiles renderer
+        self._tiles_range = None  # values range of the current frame (tiled mode)
+        self._tiles_keys = None  # (level, ty, tx) of the tile in each row of the tiles data source (tiled mode)
+        self._image_extent = None  # (xss, xse, yss, yse) - full frame extent in plot coordinates
+        self._lcm = None  # color mapper
+        self._act = None  # histogram based auto-contrast (optional)
+        self._pcds = None  # pixel probe requests column data source (optional)
+        self._probe_request = None  # last (x, y) pixel probe request
+        self._probe_scheduled = False  # is a pixel probe answer scheduled?
+        self._sat = None  # summed-area tables of the current frame (built on first ROI statistics request)
+        self._rbf = OutputBuffers()  # reusable reduced (or copied) image buffers
+        self._mbf = OutputBuffers()  # reusable RGBA image buffers
+        self._copied_bytes = 0  # num. of bytes copied (or computed) on the image path during the current tick
+        self._total_copied_bytes = 0
+        self._copy_accounting = False  # log the num. of bytes copied per tick?
+        self._prepared_update = None  # result of prepare_update (i.e. compute phase) to be applied by update
+        self._pulled = None  # data pulled by pull_update (i.e. I/O phase) to be processed by prepare_update
+        self._prepare_error = None  # exception raised by prepare_update - reported by update (IOLoop thread)
+        self._aggregation = None  # regrid into the plot pixels grid: None, 'mean', 'max', 'min' or 'first'
+        self._xcn = None  # name of the data source providing the x coordinates (see Scale.channel)
+        self._ycn = None  # name of the data source providing the y coordinates (see Scale.channel)
+        self._xco = None  # x coordinates (non uniform x axis)
+        self._yco = None  # y coordinates (non uniform y axis)
+        self._enc = None  # compressed image transport (optional ImageEncoder)
+        self._ucds = None  # encoded image column data source (data URI)
+        self._uird = None  # encoded image renderer
+        self._enc_lock = Lock()
+        self._enc_pending = None  # latest image waiting for encoding (older ones are dropped)
+        self._enc_running = False  # is a worker encoding images?
         self._cds = None  # column data source
         self._mdl = None  # model
         self._xsc = None  # x scale
@@ -1113,12 +1363,13 @@ class ImageChannel(Channel):
         self._expected_image_shape = None
         self._current_image_shape = None
         self._images_size_threshold = 100000
+        self._downsampling = 'mean'
+        self._scan_watermark = False  # images acquired row by row: only downsample the acquired rows
+        self._watermark = None  # num. of acquired rows of the current frame
 
     def __instanciate_data_source(self):
         columns = dict()
-        data = np.empty((2, 2))
-        data.fill(np.nan)
-        columns['image'] = [data]
+        columns['image'] = [self.__to_cds_image(ImageChannel.__nan_image__)]
         columns['image_width'] = [0]
         columns['image_height'] = [0]
         columns['x_hover'] = [0]
@@ -1130,13 +1381,17 @@ class ImageChannel(Channel):
         return ColumnDataSource(data=columns)
 
     def __hover_callback(self):
-        return CustomJS(args=dict(cds=self._cds), code="""
+        args = dict(cds=self._cds)
+        if self._pcds is not None:
+            args['probe'] = self._pcds
+        return CustomJS(args=args, code="""
             var pxc = cb_data['geometry'].x
             var pyc = cb_data['geometry'].y
             var plt = cb_obj.document._all_models[cds.tags[0]]
             var xrg = plt.x_range
             var yrg = plt.y_range
             var img = cds.data['image'][0]
+            var rgb = img instanceof Uint32Array
             var imw = cds.data['image_width'][0]
             var imh = cds.data['image_height'][0]
             var xst = Math.abs(plt.x_range.end - plt.x_range.start) / imw
@@ -1166,7 +1421,7 @@ class ImageChannel(Channel):
             //console.log('flatten point index = %d', flatten_pti)
             cds.data['x_hover'][0] = pxc
             cds.data['y_hover'][0] = pyc
-            if (flatten_pti < img.length) {
+            if (flatten_pti < img.length && !rgb) {
                 cds.data['z_hover'][0] = img[Math.floor(pxi + pyi * imw)]
             }
             else {
@@ -1174,8 +1429,51 @@ class ImageChannel(Channel):
             }
             //console.log('x, y, z = %f, %f, %f', pxc, pxi, cds.data['z_hover'][0])
             cds.change.emit()
+            if (typeof probe !== 'undefined') {
+                // ask the server for the full resolution value (throttled: latest position wins)
+                probe._pending = [pxc, pyc]
+                if (!probe._timer) {
+                    probe._timer = setTimeout(function() {
+                        probe._timer = null
+                        probe.data = {'x': [probe._pending[0]], 'y': [probe._pending[1]]}
+                    }, 50)
+                }
+            }
         """)
 
+    def __setup_pixel_probe(self):
+        self._pcds = ColumnDataSource(data=dict(x=[0], y=[0]))
+        self._pcds.on_change('data', self.__on_probe_request)
+
+    def __on_probe_request(self, attr, old, new):
+        # called with the document locked: coalesce the requests then answer asynchronously
+        try:
+            self._probe_request = (new['x'][0], new['y'][0])
+            if not self._probe_scheduled and self.bokeh_session:
+                self._probe_scheduled = True
+                self.bokeh_session.timeout_callback(self.__answer_probe_request, 0.01)
+        except Exception as e:
+            self.error(e)
+
+    def __answer_probe_request(self):
+        try:
+            self._probe_scheduled = False
+            sd = self._sd
+            if self._probe_request is None or not sd or sd.has_failed or not all(sd.buffer.shape):
+                return
+            x, y = self._probe_request
+            image = sd.buffer
+            xx = np.linspace(*self.__scale_bounds(self._xsc, image.shape[1]), num=image.shape[1], dtype=float)
+            yx = np.linspace(*self.__scale_bounds(self._ysc, image.shape[0]), num=image.shape[0], dtype=float)
+            xi = int(round(np.interp(x, xx, np.arange(image.shape[1]))))
+            yi = int(round(np.interp(y, yx, np.arange(image.shape[0]))))
+            inside = min(xx[0], xx[-1]) <= x <= max(xx[0], xx[-1]) and min(yx[0], yx[-1]) <= y <= max(yx[0], yx[-1])
+            z = float(image[yi, xi]) if inside else np.nan
+            # patch: don't resend the whole column data source (i.e. the image)
+            self._cds.patch({'x_hover': [(0, x)], 'y_hover': [(0, y)], 'z_hover': [(0, z)]})
+        except Exception as e:
+            self.error(e)
+
     def __setup_toolbar(self, figure, w=0, h=0):
         hrd = [self._rrd]
         hcb = self.__hover_callback()
@@ -1205,11 +1503,45 @@ class ImageChannel(Channel):
         try:
             self._mdl = None
             props = self._merge_properties(self.model_properties, kwargs)
+            self._enc = None
+            if props.get('image_encoding', None):
+                try:
+                    self._enc = ImageEncoder(props['image_encoding'], props.get('image_quality', 85))
+                except Exception as e:
+                    self.error(e)
+            self._rgba = None
+            if props.get('server_side_colormapping', False) or self._enc is not None:
+                self._rgba = RgbaColorMapper(props.get('palette', Plasma256),
+                                             props.get('colormap_low', None),
+                                             props.get('colormap_high', None))
             self._cds = self.__instanciate_data_source()
             self._xsc = props.get('x_scale', Scale())
             self._xsc.validate()
             self._ysc = props.get('y_scale', Scale())
             self._ysc.validate()
+            # non uniform axes: coordinates provided by the data sources named after the channel scales
+            self._xcn = self._xsc.channel if self._xsc.type == ScaleType.CHANNEL else None
+            self._ycn = self._ysc.channel if self._ysc.type == ScaleType.CHANNEL else None
+            self._aggregation = props.get('aggregation', None)
+            if self._aggregation is not None and self._aggregation not in regrid_functions:
+                raise ValueError("invalid aggregation '{}' - expected one of {}".format(self._aggregation,
+                                                                                     regrid_functions))
+            self._acc = FrameAccumulator.from_properties(props)
+            self._downsampling = props.get('downsampling', self._downsampling)
+            self._scan_watermark = props.get('scan_watermark', self._scan_watermark)
+            self._pyr = ImagePyramid(self._downsampling) if props.get('image_pyramid', False) else None
+            self._tde = TileDeltaEncoder.from_properties(props) if self._enc is None else None
+            self._copy_accounting = props.get('copy_accounting', False)
+            self._act = AutoContrast.from_properties(props)
+            self._pcds = None
+            # compressed image transport: the raw image is never sent, the hover values can only come from the server
+            if props.get('pixel_probe', False) or self._enc is not None:
+                self.__setup_pixel_probe()
+            self._tpc = None
+            if props.get('tiled', False):
+                self._tpc = TilePyramid(props.get('tile_size', 256),
+                                        props.get('tiles_cache_size', 64 * 1024 * 1024),
+                                        self._downsampling)
             self._images_size_threshold = self.model_properties.get('images_size_threshold', self._images_size_threshold)
             # print('ImageChannel.setup_model.images_size_threshold: {:.00f}'.format(self._images_size_threshold))
             self._expected_image_shape = self.model_properties.get('full_frame_shape', self._expected_image_shape)
@@ -1241,8 +1573,16 @@ class ImageChannel(Channel):
             ikwargs['dh'] = 1
             ikwargs['image'] = 'image'
             ikwargs['source'] = self._cds
-            ikwargs['color_mapper'] = LinearColorMapper(palette=props.get('palette', Plasma256))
-            self._ird = f.image(**ikwargs)
+            if self._rgba is not None:
+                self._ird = f.image_rgba(**ikwargs)
+            else:
+                self._lcm = LinearColorMapper(palette=props.get('palette', Plasma256))
+                ikwargs['color_mapper'] = self._lcm
+                self._ird = f.image(**ikwargs)
+            if self._tpc is not None:
+                self.__setup_tiles_glyph(f)
+            if self._enc is not None:
+                self.__setup_encoded_image_glyph(f)
             rkwargs = dict()
             rkwargs['x'] = 0
             rkwargs['y'] = 0
@@ -1260,11 +1600,136 @@ class ImageChannel(Channel):
             bsm = props.get('selection_manager', None)
             if bsm:
                 bsm.register_figure(f)
+                bsm.register_statistics_provider(self.name, self.roi_statistics)
             self._itm.setup(self.bokeh_session, self._mdl, self.__handle_range_change)
         except Exception as e:
             self.error(e)
         return self._mdl
 
+    def __setup_tiles_glyph(self, f):
+        # tiled mode: one row per visible tile
+        self._tcds = ColumnDataSource(data=dict(image=[], x=[], y=[], dw=[], dh=[]))
+        tkwargs = dict(image='image', x='x', y='y', dw='dw', dh='dh', source=self._tcds)
+        if self._rgba is not None:
+            self._tird = f.image_rgba(**tkwargs)
+        else:
+            # tiles share the image color mapper (its range is set from the whole frame - see __update_tiles)
+            tkwargs['color_mapper'] = self._lcm
+            self._tird = f.image(**tkwargs)
+
+    def __setup_encoded_image_glyph(self, f):
+        # compressed image transport: the image is sent as a PNG/JPEG/WebP data URI
+        self._ucds = ColumnDataSource(data=dict(url=[], x=[], y=[], w=[], h=[]))
+        ukwargs = dict(url='url', x='x', y='y', w='w', h='h', anchor='bottom_left', source=self._ucds)
+        self._uird = f.image_url(**ukwargs)
+        # the raw image renderer only remains for the hover tool (see __hover_callback)
+        self._ird.visible = False
+
+    def __submit_encoding(self, rgba, x, y, w, h):
+        # images are encoded on the workers pool - latest image wins: the pending one (if any) is dropped
+        with self._enc_lock:
+            self._enc_pending = (rgba, x, y, w, h)
+            if self._enc_running:
+                return
+            self._enc_running = True
+        WorkersPool.instance().apply_async(self.__encode_pending_images)
+
+    def __encode_pending_images(self):
+        # runs on a worker thread
+        while True:
+            with self._enc_lock:
+                job, self._enc_pending = self._enc_pending, None
+                if job is None or self._enc is None:
+                    self._enc_running = False
+                    return
+            try:
+                rgba, x, y, w, h = job
+                columns = dict(url=[self._enc.encode(rgba)], x=[x], y=[y], w=[w], h=[h])
+                self.bokeh_session.safe_document_modifications(self.__encoded_image_updater(columns))
+            except Exception as e:
+                # reporting switches the notebook output: done on the IOLoop thread (bare logger otherwise)
+                session = self.bokeh_session
+                if session is not None and session.ready:
+                    session.safe_document_modifications(self.__error_reporter(e))
+                else:
+                    self.logger.error(e)
+
+    def __error_reporter(self, error):
+        def report_error():
+            self.error(error)
+        return report_error
+
+    def __encoded_image_updater(self, columns):
+        def update_encoded_image():
+            if self._ucds is not None:
+                self._ucds.data.update(columns)
+        return update_encoded_image
+
+    def __update_tiles(self):
+        """send the tiles covering the current ranges at the appropriate pyramid level (only the new ones)"""
+        known = set(self._tiles_keys) if self._tiles_keys is not None else None
+        tiles, lcm_range = self.__visible_tiles(known=known)
+        self.__push_tiles(tiles, lcm_range, full=known is None)
+
+    def __visible_tiles(self, ranges=None, known=None):
+        """returns the (key, image, x, y, dw, dh) of the tiles covering the current ranges and the range to apply to
+        the color mapper (or None) - the image of the tiles in 'known' is not computed (i.e. None)"""
+        frame = self._tpc.frame
+        lcm_range = None
+        if self._tiles_range is None and self._act is not None:
+            self._tiles_range = self._act.range
+        elif self._tiles_range is None:
+            # frame values range estimated from a strided subsample (never build the whole pyramid for that)
+            self._tiles_range = lcm_range = nan_range(strided_subsample(frame))
+        low, high = self._tiles_range if self._tiles_range is not None else (None, None)
+        xss, xse, yss, yse = self._image_extent
+        px = (xse - xss) / float(frame.shape[1])
+        py = (yse - yss) / float(frame.shape[0])
+        ysi, yei, xsi, xei = self.__current_ranges_indexes(frame, ranges)
+        level = self._tpc.level_for_size(yei - ysi, xei - xsi, self._images_size_threshold)
+        tiles = list()
+        for ty, tx in self._tpc.visible_tiles(level, ysi, yei, xsi, xei):
+            key = (level, ty, tx)
+            ys, ye, xs, xe = self._tpc.tile_extent(level, ty, tx)
+            image = None
+            if known is None or key not in known:
+                image = self.__to_cds_image(self._tpc.tile(level, ty, tx), low, high)
+            tiles.append((key, image, xss + xs * px, yss + ys * py, (xe - xs) * px, (ye - ys) * py))
+        return tiles, lcm_range
+
+    def __push_tiles(self, tiles, lcm_range, full):
+        """update the tiles data source - unless full, only the tiles that are not already displayed are sent"""
+        if lcm_range is not None and self._lcm is not None:
+            self._lcm.update(low=lcm_range[0], high=lcm_range[1])
+        columns = ('image', 'x', 'y', 'dw', 'dh')
+        if full or self._tiles_keys is None:
+            self._tcds.data.update(dict([(c, [t[i + 1] for t in tiles]) for i, c in enumerate(columns)]))
+            self._tiles_keys = [t[0] for t in tiles]
+            return
+        keys = set([t[0] for t in tiles])
+        # rows of the tiles that are no longer visible are reused for the new ones
+        free_rows = [r for r, k in enumerate(self._tiles_keys) if k is None or k not in keys]
+        displayed = set(self._tiles_keys)
+        new_tiles = [t for t in tiles if t[0] not in displayed]
+        patches = dict([(c, list()) for c in columns])
+        for r, t in zip(free_rows, new_tiles):
+            self._tiles_keys[r] = t[0]
+            for i, c in enumerate(columns):
+                patches[c].append((r, t[i + 1]))
+        for r in free_rows[len(new_tiles):]:
+            # the remaining free rows are hidden (their image is not resent)
+            if self._tiles_keys[r] is not None:
+                self._tiles_keys[r] = None
+                patches['dw'].append((r, 0.))
+                patches['dh'].append((r, 0.))
+        patches = dict([(c, p) for c, p in six.iteritems(patches) if len(p)])
+        if patches:
+            self._tcds.patch(patches)
+        extra_tiles = new_tiles[len(free_rows):]
+        if extra_tiles:
+            self._tcds.stream(dict([(c, [t[i + 1] for t in extra_tiles]) for i, c in enumerate(columns)]))
+            self._tiles_keys.extend([t[0] for t in extra_tiles])
+
     def __setup_undefined_scales(self, img_shape):
         # print("__setup_undefined_scales.img_shape: {}".format(img_shape))
         if img_shape is None:
@@ -1291,9 +1756,21 @@ class ImageChannel(Channel):
                 return
             # print("ImageChannel.{}:handle_range_change: x-range changed to ({:.04f}, {:.04f})".format(self.name, self._mdl.x_range.start, self._mdl.x_range.end))
             # print("ImageChannel.{}:handle_range_change: y-range changed to ({:.04f}, {:.04f})".format(self.name, self._mdl.y_range.start, self._mdl.y_range.end))
-            image = self.__extract_image_for_current_ranges(sd.buffer)
+            if self._tpc is not None:
+                self.__update_tiles()
+                return
+            image = self.__extract_image_for_current_ranges(self._frame)
+            if self._tde is not None:
+                # full image sent: the encoder reference is obsolete
+                self._tde.reset()
             new_data = dict()
-            new_data['image'] = [image]
+            cds_image = self.__to_cds_image(image, reuse_buffer=True)
+            if self._enc is not None:
+                xs, xe = self._mdl.x_range.start, self._mdl.x_range.end
+                ys, ye = self._mdl.y_range.start, self._mdl.y_range.end
+                self.__submit_encoding(cds_image, xs, ys, abs(xe - xs), abs(ye - ys))
+            else:
+                new_data['image'] = [cds_image]
             new_data['image_width'] = [image.shape[1]]
             new_data['image_height'] = [image.shape[0]]
             self._cds.data.update(new_data)
@@ -1309,160 +1786,497 @@ class ImageChannel(Channel):
     def __image_shape_changed(self, image_shape):
         return self._current_image_shape != image_shape
 
-    def __extract_image_for_current_ranges(self, image):
-        xsc = self._mdl.x_range.start
-        xec = self._mdl.x_range.end
-        xx = np.linspace(self._xsc.start, self._xsc.end, num=image.shape[1], dtype=float)
+    @staticmethod
+    def __scale_bounds(scale, num_points):
+        # a channel scale has no bounds until its coordinates have been pulled: indexes meanwhile
+        if scale.start is None or scale.end is None:
+            return 0, num_points - 1
+        return scale.start, scale.end
+
+    def __coordinates_to_indexes(self, image, xsc, xec, ysc, yec):
+        xx = np.linspace(*self.__scale_bounds(self._xsc, image.shape[1]), num=image.shape[1], dtype=float)
         xy = np.linspace(0, image.shape[1] - 1, num=image.shape[1], dtype=int)
-        # print("__extract_image_for_current_ranges.2")
-        ysc = self._mdl.y_range.start
-        yec = self._mdl.y_range.end
-        # print("extract_image_for_current_ranges: x:({:.04f}, {:.04f}) - y:({:.04f} -> {:.04f})".format(xsc, xec, ysc, yec))
-        yx = np.linspace(self._ysc.start, self._ysc.end, num=image.shape[0], dtype=float)
+        yx = np.linspace(*self.__scale_bounds(self._ysc, image.shape[0]), num=image.shape[0], dtype=float)
         yy = np.linspace(0, image.shape[0] - 1, num=image.shape[0], dtype=int)
         xsi = int(mt.floor(np.interp(xsc, xx, xy)))
         xei = int(mt.ceil(np.interp(xec, xx, xy)) + 1)
         ysi = int(mt.floor(np.interp(ysc, yx, yy)))
         yei = int(mt.ceil(np.interp(yec, yx, yy)) + 1)
+        return ysi, yei, xsi, xei
+
+    def __current_ranges_indexes(self, image, ranges=None):
+        # ranges: optional (xsc, xec, ysc, yec) overriding the current figure ranges
+        if ranges is None:
+            ranges = (self._mdl.x_range.start, self._mdl.x_range.end, self._mdl.y_range.start, self._mdl.y_range.end)
+        xsc, xec, ysc, yec = ranges
+        # print("extract_image_for_current_ranges: x:({:.04f}, {:.04f}) - y:({:.04f} -> {:.04f})".format(xsc, xec, ysc, yec))
+        ysi, yei, xsi, xei = self.__coordinates_to_indexes(image, xsc, xec, ysc, yec)
         # print("extract_image_for_current_ranges: x:[{:.00f} -> {:.00f}] - y:[{:.00f} -> {:.00f}]".format(xsi, xei, ysi, yei))
+        return ysi, yei, xsi, xei
+
+    def roi_statistics(self, selection_range):
+        """returns the count, sum, mean and std of the current frame pixels in the specified selection range
+
+        selection_range is a dict with 'x0', 'x1', 'y0' and 'y1' keys (plot coordinates) - NaN pixels are ignored
+        returns None if there's no frame to compute the statistics on
+        """
+        frame = self._frame
+        if frame is None or frame.ndim != 2 or not all(frame.shape) or self._xsc is None or self._ysc is None:
+            return None
+        sat = self._sat
+        if sat is None or sat.shape != frame.shape:
+            # one vectorized pass per frame - then each selection is answered in constant time
+            sat = self._sat = SummedAreaTables(frame)
+        xs, xe = sorted((selection_range['x0'], selection_range['x1']))
+        ys, ye = sorted((selection_range['y0'], selection_range['y1']))
+        ysi, yei, xsi, xei = self.__coordinates_to_indexes(frame, xs, xe, ys, ye)
+        ysi, yei = sorted((ysi, yei))
+        xsi, xei = sorted((xsi, xei))
+        return sat.statistics(ysi, yei, xsi, xei)
+
+    def __extract_image_for_current_ranges(self, image, ranges=None):
+        self._extraction = None
+        if self._aggregation is not None:
+            # aggregation mode: regrid into the plot pixels grid
+            return self.__aggregate(image, ranges)
+        ysi, yei, xsi, xei = self.__current_ranges_indexes(image, ranges)
+        if self._pyr is not None and self._pyr.frame is image:
+            # pyramid mode: select the appropriate level then crop (no rescaling)
+            return self._pyr.extract(ysi, yei, xsi, xei, self._images_size_threshold)
+        filled_rows = None if self._watermark is None else max(0, self._watermark - max(0, ysi))
         image = image[ysi:yei, xsi:xei]
         # print("extract_image_for_current_ranges.sub_image.shape: {}".format(image.shape))
         need_rescale, rescaling_factor = self.__compute_rescaling_factor(image)
         if need_rescale:
-            image = self.__rescale_image(image, rescaling_factor)
+            out = self.__output_buffer(self._rbf,
+                                       block_reduce_shape(image.shape, rescaling_factor),
+                                       block_reduce_dtype(image.dtype, self._downsampling))
+            image = self.__rescale_image(image, rescaling_factor, filled_rows, out)
             # print("extract_image_for_current_ranges.sub_image.rescaled to {}".format(image.shape))
+        elif self._sd is not None and self._sd.updated_rows is not None:
+            # rows will be patched in place (see __rows_patch): the image can't be a view of the source buffer
+            out = self.__output_buffer(self._rbf, image.shape, image.dtype)
+            if out is None:
+                image = image.copy()
+            else:
+                np.copyto(out, image)
+                image = out
+            self.__count_copy(image)
+        # remember how the image was obtained (see __rows_patch)
+        self._extraction = (ysi, yei, xsi, xei, rescaling_factor)
         return image
 
-    def __compute_rescaling_factor(self, image):
+    def __aggregate(self, image, ranges=None):
+        if ranges is None:
+            ranges = (self._mdl.x_range.start, self._mdl.x_range.end, self._mdl.y_range.start, self._mdl.y_range.end)
+        xsc, xec, ysc, yec = ranges
+        xss, xse, yss, yse = self._image_extent
+        h, w = image.shape
+        # pixels centers: either the actual (non uniform) coordinates or evenly spaced over the image extent
+        xco = self._xco if self._xco is not None else xss + (np.arange(w) + 0.5) * ((xse - xss) / float(w))
+        yco = self._yco if self._yco is not None else yss + (np.arange(h) + 0.5) * ((yse - yss) / float(h))
+        return self.__count_copy(regrid(image, xco, yco, (xsc, xec), (ysc, yec), self.__frame_shape(), self._aggregation))
+
+    def __frame_shape(self):
+        # the (height, width) in pixels of the plot area (i.e. without axes, toolbar, borders)
+        mdl = self._mdl
+        h, w = getattr(mdl, 'inner_height', None), getattr(mdl, 'inner_width', None)
+        if h and w:
+            return int(h), int(w)
+        # not reported by the client (yet): subtract the borders from the canvas size
+        border = mdl.min_border if mdl.min_border is not None else 0
+        borders = [b if b is not None else border for b in (mdl.min_border_top,
+                                                              mdl.min_border_bottom,
+                                                              mdl.min_border_left,
+                                                              mdl.min_border_right)]
+        h = mdl.plot_height - borders[0] - borders[1]
+        w = mdl.plot_width - borders[2] - borders[3]
+        return max(1, int(h)), max(1, int(w))
+
+    def __pull_coordinates(self, data_source_name):
+        # returns the data of the specified coordinates data source or None if unavailable
+        ds = self.data_sources.get(data_source_name, None) if data_source_name is not None else None
+        return ds.pull_data() if ds is not None else None
+
+    @staticmethod
+    def __valid_coordinates(cd, num_points):
+        # returns the coordinates provided by the specified channel data or None if unavailable
+        if cd is None or cd.has_failed or cd.buffer is None:
+            return None
+        coordinates = np.asarray(cd.buffer, dtype=np.float64).ravel()
+        return coordinates if coordinates.shape[0] == num_points else None
+
+    @staticmethod
+    def __coordinates_scale(scale, coordinates):
+        # linear scale spanning the coordinates (image extent, hover, ...) - regrid uses the actual coordinates
+        if coordinates is None or coordinates.shape[0] < 2 or coordinates[0] == coordinates[-1]:
+            return scale
+        if scale.range == (coordinates[0], coordinates[-1], coordinates.shape[0]):
+            return scale
+        return Scale(start=coordinates[0],
+                     end=coordinates[-1],
+                     num_points=coordinates.shape[0],
+                     label=scale.label,
+                     unit=scale.unit)
+
+    def __update_coordinates(self, pulled):
+        # non uniform axes (aggregation mode only)
+        frame = self._frame
+        if frame is None or frame.ndim != 2 or not all(frame.shape):
+            self._xco = self._yco = None
+            return
+        self._xco = self.__valid_coordinates(pulled.get('x', None), frame.shape[1])
+        self._yco = self.__valid_coordinates(pulled.get('y', None), frame.shape[0])
+        self._xsc = self.__coordinates_scale(self._xsc, self._xco)
+        self._ysc = self.__coordinates_scale(self._ysc, self._yco)
+
+    def __rows_patch(self, sd, image_shape_changed):
+        """returns a ColumnDataSource patch for the rows updated by the source or None if a full update is required"""
+        rows = sd.updated_rows
+        if rows is None or image_shape_changed or self._extraction is None or self._acc is not None:
+            return None
+        if self._enc is not None:
+            # compressed image transport: the whole image is encoded anyway
+            return None
+        if self._rgba is not None and (self._rgba.low is None or self._rgba.high is None):
+            # auto colormapping range: the whole image has to be remapped
+            return None
+        ysi, yei, xsi, xei, rescaling_factor = self._extraction
+        if self.__current_ranges_indexes(sd.buffer) != (ysi, yei, xsi, xei):
+            # the ranges changed since last (full) update
+            return None
+        yei = min(yei, sd.buffer.shape[0])
+        rsi, rei = max(rows[0], ysi), min(rows[1], yei)
+        if rsi >= rei:
+            return dict()
+        # rows of the displayed image impacted by the incoming ones (blocks of rescaling_factor rows)
+        osi = (rsi - ysi) // rescaling_factor
+        oei = -(-(rei - ysi) // rescaling_factor)
+        region = sd.buffer[ysi + osi * rescaling_factor:min(ysi + oei * rescaling_factor, yei), xsi:xei]
+        rows_data = self.__to_cds_image(self.__rescale_image(region, rescaling_factor))
+        if rows_data.base is not None and not rows_data.flags.c_contiguous:
+            # ravel will copy the (non contiguous) rows
+            self.__count_copy(rows_data)
+        return {'image': [((0, slice(osi, oei), slice(0, rows_data.shape[1])), rows_data.ravel())]}
+
+    def __to_cds_image(self, image, low=None, high=None, reuse_buffer=False):
+        # server side colormapping: send packed RGBA (uint32) instead of raw values
+        if self._rgba is None:
+            return image
+        out = self.__output_buffer(self._mbf, image.shape, np.uint32) if reuse_buffer else None
+        return self.__count_copy(self._rgba.map(image, low, high, out))
+
+    def __cds_image(self):
+        # the image currently held by the column data source
         try:
-            rescaling_factor = 1.0
-            initial_image_size = image_size = image.shape[0] * image.shape[1]
-            # print("compute_rescaling_factor: size: {:.04f} - threshold: {:.04f}".format(image_size, image_size_threshold))
-            if image_size <= self._images_size_threshold:
-                # print("compute_rescaling_factor: no rescaling required")
-                return False, rescaling_factor
-            for inc in [0.1, 0.01, 0.001, 0.0001]:
-                while image_size > self._images_size_threshold:
-                    rescaling_factor -= inc
-                    image_size = int(initial_image_size * rescaling_factor)
-                rescaling_factor += inc
-                image_size = int(initial_image_size * rescaling_factor)
-            rescaling_factor = mt.sqrt(rescaling_factor)
-            # print("compute_rescaling_factor.rescaling factor: {:.04f}".format(rescaling_factor))
-            return True, rescaling_factor
-        except Exception as e:
-            print(e)
+            return self._cds.data['image'][0]
+        except (AttributeError, KeyError, IndexError, TypeError):
+            return None
+
+    def __output_buffer(self, buffers, shape, dtype):
+        # a reusable output buffer - except when the output is handed over to the delta or image encoder (they keep
+        # a reference to it) - reusing is safe because bokeh serializes the CDS data when it changes (see OutputBuffers)
+        if self._tde is not None or self._enc is not None:
+            return None
+        return buffers.get(shape, dtype, busy=self.__cds_image())
+
+    def __owns(self, image):
+        # is the image a private array of this tick (i.e. neither the source buffer, a view nor a reused buffer)?
+        if self._tde is None or image.base is not None or image is self._frame:
+            return False
+        return self._sd is None or image is not self._sd.buffer
+
+    def __count_copy(self, array):
+        # copy accounting (see copied_bytes)
+        self._copied_bytes += array.nbytes
+        return array
 
-    def __rescale_image(self, in_img, rescaling_factor):
+    @property
+    def tile_delta_max_dirty_ratio(self):
+        """returns the ratio of dirty tiles above which the full image is sent (tile delta mode)"""
+        return self._model_props.get('tile_delta_max_dirty_ratio', 0.5)
+
+    @tile_delta_max_dirty_ratio.setter
+    def tile_delta_max_dirty_ratio(self, ratio):
+        """set the ratio of dirty tiles above which the full image is sent (tile delta mode) - in [0, 1]"""
+        if self._tde is not None:
+            self._tde.max_dirty_ratio = ratio
+        self._model_props['tile_delta_max_dirty_ratio'] = ratio
+
+    @property
+    def copied_bytes(self):
+        """num. of bytes copied (or computed) on the image path, from source to column data source, during the
+        last update (i.e. tick) - a debugging counter meant to track the unexpected copies of the frames"""
+        return self._copied_bytes
+
+    @property
+    def total_copied_bytes(self):
+        return self._total_copied_bytes
+
+    def __compute_rescaling_factor(self, image):
+        # the rescaling factor is the (integer) size of the blocks to be reduced to a single pixel
+        rescaling_factor = downsampling_factor(image.shape, self._images_size_threshold)
+        # print("compute_rescaling_factor.rescaling factor: {}".format(rescaling_factor))
+        return rescaling_factor > 1, rescaling_factor
+
+    def __rescale_image(self, in_img, rescaling_factor, filled_rows=None, out=None):
         # print('rescale-image: in shape {}'.format(in_img.shape))
-        out_img = rescale(in_img, rescaling_factor, mode='constant', cval=np.nan)
+        out_img = block_reduce(in_img, rescaling_factor, self._downsampling, filled_rows, out)
+        if out_img is not in_img:
+            self.__count_copy(out_img)
         # print('rescale-image: out shape {}'.format(out_img.shape))
         return out_img
 
-    def update(self, update_image=True):
-        """gives each Channel a chance to update itself (e.g. to update the ColumnDataSources)"""
+    def __update_contrast(self):
+        # server side auto-contrast: the color mapper range is only changed when it matters
+        # returns the range to apply to the (client side) color mapper or None
+        if self._act is None or self._frame is None or not all(self._frame.shape):
+            return None
+        if not self._act.update(self._frame):
+            return None
+        low, high = self._act.range
+        if self._rgba is not None:
+            self._rgba.low, self._rgba.high = low, high
+            # rows already sent were mapped with the previous range
+            self._extraction = None
+            return None
+        return low, high
+
+    def __accumulate(self, sd):
+        # returns either the raw frame or the accumulated one (i.e. running mean, sum or ewma)
+        if self._acc is None or sd.has_failed or sd.buffer is None or not all(sd.buffer.shape):
+            return sd.buffer
+        return self.__count_copy(self._acc.push(sd.buffer))
+
+    def pull_update(self):
+        """I/O phase of the next update: pulls the data sources on the calling (IOLoop) thread (see LayoutChannel)"""
         try:
-            ds = self.data_source
-            if ds is None:
-                return
-            if update_image:
-                self._sd = ds.pull_data()
-            sd = self._sd
-            previous_bad_source_cnt = self._bad_source_cnt
-            if sd.has_failed:
-                self._bad_source_cnt = 1
-                self.emit_error(sd)
-            elif previous_bad_source_cnt:
-                self._bad_source_cnt = 0
-                self.emit_recover()
-            empty_buffer = sd.has_failed or not all(sd.buffer.shape)
-            nan_buffer = None
-            if empty_buffer:
-                nan_buffer = np.empty((2, 2))
-                nan_buffer.fill(np.nan)
-                self._animate_msg_label()
-            else:
-                self._hide_msg_label()
-            incoming_image = sd.buffer if not empty_buffer else nan_buffer
-            image_shape_changed = self.__image_shape_changed(incoming_image.shape)
-            self._current_image_shape = incoming_image.shape
-            if not empty_buffer:
-                self.__setup_undefined_scales(sd.buffer.shape)
-            if empty_buffer:
-                xss = -1.
-                xse = 1.
-                xst = 1.
-                xpn = 3
-            elif self._xsc.type != ScaleType.INDEXES:
-                xss = self._xsc.start
-                if self._expected_image_shape is None:
-                    xse = self._xsc.start + ((sd.buffer.shape[1] - 1) * self._xsc.step)
-                else:
-                    xse = self._xsc.end
-                xst = self._xsc.step
-                xpn = sd.buffer.shape[1]
+            self._pulled = self.__pull()
+        except Exception as e:
+            self._pulled = None
+            self.error(e)
+
+    def __pull(self):
+        ds = self.data_source
+        if ds is None:
+            return None
+        pulled = dict(sd=ds.pull_data())
+        if self._aggregation is not None:
+            pulled['x'] = self.__pull_coordinates(self._xcn)
+            pulled['y'] = self.__pull_coordinates(self._ycn)
+        return pulled
+
+    def prepare_update(self):
+        """compute phase of the next update: processes the incoming frame (crop, rescale, colormapping, ...)
+
+        neither modifies the Bokeh document nor pulls the data sources (see pull_update) so that it can run on a
+        worker thread (see LayoutChannel) - the result is applied to the document by the next call to update
+        """
+        try:
+            self._prepared_update = self.__prepare_update(True)
+        except Exception as e:
+            # reporting switches the notebook output (i.e. the kernel state): only done on the IOLoop thread
+            self._prepared_update = None
+            self._prepare_error = e
+
+    def __prepare_update(self, update_image):
+        ds = self.data_source
+        if ds is None:
+            return None
+        u = dict(update_image=update_image, lcm_range=None, patch=None, image=None, tiles=None, tde=None, encoded=None)
+        if update_image:
+            self._total_copied_bytes += self._copied_bytes
+            self._copied_bytes = 0
+            # data pulled beforehand by pull_update (if any)
+            pulled, self._pulled = self._pulled, None
+            if pulled is None:
+                pulled = self.__pull()
+            self._sd = pulled['sd']
+            self._frame = self.__accumulate(self._sd)
+            if self._aggregation is not None:
+                self.__update_coordinates(pulled)
+            self._sat = None
+            self._watermark = None
+            if self._scan_watermark and self._frame is not None and all(self._frame.shape):
+                self._watermark = nan_watermark(self._frame)
+            if self._pyr is not None:
+                self._pyr.set_frame(self._frame)
+            if self._tpc is not None:
+                self._tpc.set_frame(self._frame)
+                self._tiles_range = None
+            u['lcm_range'] = self.__update_contrast()
+        sd = u['sd'] = self._sd
+        empty_buffer = u['empty_buffer'] = sd.has_failed or not all(sd.buffer.shape)
+        incoming_image = sd.buffer if not empty_buffer else ImageChannel.__nan_image__
+        image_shape_changed = u['image_shape_changed'] = self.__image_shape_changed(incoming_image.shape)
+        self._current_image_shape = incoming_image.shape
+        if not empty_buffer:
+            self.__setup_undefined_scales(sd.buffer.shape)
+        if empty_buffer:
+            xss = -1.
+            xse = 1.
+        elif self._xsc.type != ScaleType.INDEXES and self._xsc.start is not None:
+            # (see __scale_bounds)
+            xss = self._xsc.start
+            if self._expected_image_shape is None:
+                xse = self._xsc.start + ((sd.buffer.shape[1] - 1) * self._xsc.step)
             else:
-                xss = 0.
-                xse = sd.buffer.shape[1]
-                xst = 1.
-                xpn = sd.buffer.shape[1]
-            if empty_buffer:
-                yss = -1.
-                yse = 1.
-                yst = 1.
-                ypn = 3
-            elif self._ysc.type != ScaleType.INDEXES:
-                yss = self._ysc.start
-                if self._expected_image_shape is None:
-                    yse = self._ysc.start + ((sd.buffer.shape[0] - 1) * self._ysc.step)
-                else:
-                    yse = self._ysc.end
-                yst = self._ysc.step
-                ypn = sd.buffer.shape[0]
+                xse = self._xsc.end
+        else:
+            xss = 0.
+            xse = sd.buffer.shape[1]
+        if empty_buffer:
+            yss = -1.
+            yse = 1.
+        elif self._ysc.type != ScaleType.INDEXES and self._ysc.start is not None:
+            yss = self._ysc.start
+            if self._expected_image_shape is None:
+                yse = self._ysc.start + ((sd.buffer.shape[0] - 1) * self._ysc.step)
             else:
-                yss = 0.
-                yse = sd.buffer.shape[0]
-                yst = 1.
-                ypn = sd.buffer.shape[0]
-            w = abs(xse - xss)
-            h = abs(yse - yss)
-            if not w:
-                xss = -1.
-                xse = 1.
-            if not h:
-                yss = -1.
-                yse = 1.
-            if image_shape_changed and not empty_buffer:  # TODO: remove 'and not empty_buffer'
-                # print("ImageChannel.{}:changing x-range to ({:.04f}, {:.04f})".format(self.name, xss, xse))
-                # print("ImageChannel.{}:changing y-range to ({:.04f}, {:.04f})".format(self.name, yss, yse))
-                self._mdl.x_range.update(start=xss, end=xse)
-                self._mdl.y_range.update(start=yss, end=yse)
-                self._ird.glyph.update(x=xss, y=yss, dw=w, dh=h)
-                self._rrd.glyph.update(x=xss + w / 2, y=yss + h / 2, width=w, height=h)
+                yse = self._ysc.end
+        else:
+            yss = 0.
+            yse = sd.buffer.shape[0]
+        if not empty_buffer:
+            self._image_extent = (xss, xse, yss, yse)
+        w = abs(xse - xss)
+        h = abs(yse - yss)
+        if not w:
+            xss = -1.
+            xse = 1.
+        if not h:
+            yss = -1.
+            yse = 1.
+        u['extent'] = (xss, xse, yss, yse, w, h)
+        # the figure ranges will be reset to the image extent (see __apply_update)
+        ranges = (xss, xse, yss, yse) if image_shape_changed and not empty_buffer else None
+        if not empty_buffer and update_image:
+            # scanning images: only send the rows acquired since the last update (when possible)
+            u['patch'] = self.__rows_patch(sd, image_shape_changed)
+            if u['patch'] is not None:
+                if self._tde is not None:
+                    # the client side image is no longer the encoder reference
+                    self._tde.reset()
+                return u
+        if self._tpc is not None and not empty_buffer:
+            # tiled mode: the image is rendered by the tiles renderer
+            u['tiles'] = self.__visible_tiles(ranges)
+            return u
+        if not empty_buffer:
+            image = u['image'] = self.__extract_image_for_current_ranges(self._frame, ranges)
+        else:
+            self._extraction = None
+            image = u['image'] = ImageChannel.__nan_image__
+        cds_image = u['cds_image'] = self.__to_cds_image(image, reuse_buffer=not empty_buffer)
+        if self._enc is not None and not empty_buffer:
+            # compressed image transport: the image is drawn over the current ranges (see __apply_update)
+            xs, xe, ys, ye = ranges if ranges is not None else (self._mdl.x_range.start,
+                                                                 self._mdl.x_range.end,
+                                                                 self._mdl.y_range.start,
+                                                                 self._mdl.y_range.end)
+            u['encoded'] = (cds_image, xs, ys, abs(xe - xs), abs(ye - ys))
+        elif self._tde is not None and not empty_buffer:
+            # slowly changing images: only send the tiles that changed since the last sent image
+            owned = self.__owns(cds_image)
+            full_refresh, payload = self._tde.encode(cds_image, owned)
+            if full_refresh:
+                if not owned:
+                    self.__count_copy(payload)
+                u['cds_image'] = payload
             else:
-                x = self._mdl.x_range.start
-                y = self._mdl.y_range.start
-                dw = abs(self._mdl.x_range.end - self._mdl.x_range.start)
-                dh = abs(self._mdl.y_range.end - self._mdl.y_range.start)
-                self._ird.glyph.update(x=x, y=y, dw=dw, dh=dh)
-                self._rrd.glyph.update(x=x + dw / 2, y=y + dh / 2, width=dw, height=dh)
-            if not empty_buffer:
-                image = self.__extract_image_for_current_ranges(sd.buffer)
+                patches = list()
+                for ys, ye, xs, xe in payload:
+                    tile = self.__count_copy(cds_image[ys:ye, xs:xe].ravel())
+                    patches.append(((0, slice(ys, ye), slice(xs, xe)), tile))
+                u['tde'] = patches
+        return u
+
+    def update(self, update_image=True):
+        """gives each Channel a chance to update itself (e.g. to update the ColumnDataSources)"""
+        try:
+            u, self._prepared_update = self._prepared_update, None
+            error, self._prepare_error = self._prepare_error, None
+            if error is not None:
+                # the compute phase failed on a worker thread (see prepare_update)
+                raise error
+            if u is None or not update_image:
+                u = self.__prepare_update(update_image)
+            if u is not None:
+                self.__apply_update(u)
+        except Exception as e:
+            self.error(e)
+        finally:
+            if self._copy_accounting and update_image:
+                self.debug("ImageChannel.{}: {} bytes copied".format(self.name, self._copied_bytes))
+
+    def __apply_update(self, u):
+        """apply phase of update: pushes the result of __prepare_update to the Bokeh document"""
+        sd = u['sd']
+        previous_bad_source_cnt = self._bad_source_cnt
+        if sd.has_failed:
+            self._bad_source_cnt = 1
+            self.emit_error(sd)
+        elif previous_bad_source_cnt:
+            self._bad_source_cnt = 0
+            self.emit_recover()
+        empty_buffer = u['empty_buffer']
+        if empty_buffer:
+            self._animate_msg_label()
+        else:
+            self._hide_msg_label()
+        if u['lcm_range'] is not None and self._lcm is not None:
+            self._lcm.update(low=u['lcm_range'][0], high=u['lcm_range'][1])
+        image_shape_changed = u['image_shape_changed']
+        xss, xse, yss, yse, w, h = u['extent']
+        if image_shape_changed and not empty_buffer:  # TODO: remove 'and not empty_buffer'
+            # print("ImageChannel.{}:changing x-range to ({:.04f}, {:.04f})".format(self.name, xss, xse))
+            # print("ImageChannel.{}:changing y-range to ({:.04f}, {:.04f})".format(self.name, yss, yse))
+            self._mdl.x_range.update(start=xss, end=xse)
+            self._mdl.y_range.update(start=yss, end=yse)
+            self._ird.glyph.update(x=xss, y=yss, dw=w, dh=h)
+            self._rrd.glyph.update(x=xss + w / 2, y=yss + h / 2, width=w, height=h)
+        else:
+            x = self._mdl.x_range.start
+            y = self._mdl.y_range.start
+            dw = abs(self._mdl.x_range.end - self._mdl.x_range.start)
+            dh = abs(self._mdl.y_range.end - self._mdl.y_range.start)
+            self._ird.glyph.update(x=x, y=y, dw=dw, dh=dh)
+            self._rrd.glyph.update(x=x + dw / 2, y=y + dh / 2, width=dw, height=dh)
+        patch = u['patch']
+        if patch is not None:
+            if len(patch):
+                self._cds.patch(patch)
+            if self._cds.data['image_shape_changed'][0]:
+                self._cds.data.update(image_shape_changed=[0])
+            return
+        new_data = dict()
+        image = u['image']
+        if u['tiles'] is not None:
+            # new frame: every tile changed
+            tiles, lcm_range = u['tiles']
+            self.__push_tiles(tiles, lcm_range, full=True)
+        elif empty_buffer and self._tcds is not None:
+            self._tcds.data.update(image=[], x=[], y=[], dw=[], dh=[])
+            self._tiles_keys = None
+        if empty_buffer and self._ucds is not None:
+            self._ucds.data.update(url=[], x=[], y=[], w=[], h=[])
+        if image is not None:
+            if u['encoded'] is not None:
+                self.__submit_encoding(*u['encoded'])
+            elif u['tde'] is not None:
+                if len(u['tde']):
+                    self._cds.patch({'image': u['tde']})
             else:
-                image = nan_buffer
-            new_data = dict()
-            new_data['image'] = [image]
+                new_data['image'] = [u['cds_image']]
             new_data['image_width'] = [image.shape[1]]
             new_data['image_height'] = [image.shape[0]]
-            if image_shape_changed:
-                new_data['image_shape_changed'] = [1]
-                new_data['initial_x_range'] = [[xss, xse]]
-                new_data['initial_y_range'] = [[yss, yse]]
-            else:
-                new_data['image_shape_changed'] = [0]
-            self._cds.data.update(new_data)
-        except Exception as e:
-            self.error(e)
+        if image_shape_changed:
+            new_data['image_shape_changed'] = [1]
+            new_data['initial_x_range'] = [[xss, xse]]
+            new_data['initial_y_range'] = [[yss, yse]]
+        else:
+            new_data['image_shape_changed'] = [0]
+        self._cds.data.update(new_data)
 
     def cleanup(self):
         self.__reinitialize()
@@ -1550,6 +2364,8 @@ class LayoutChannel(Channel):
         self._mdl = None
         # tabs widget (layout option)
         self._tabs_widget = None
+        # process the sub-channels frames in parallel (see update)
+        self._parallel_updates = True
         # sub-channels
         self._channels = Children(self, Channel)
         self._channels.register_add_callback(self.__on_add_channel)
@@ -1699,6 +2515,7 @@ class LayoutChannel(Channel):
         try:
             self._mdl = None
             props = self._merge_properties(self.model_properties, kwargs)
+            self._parallel_updates = props.get('parallel_updates', self._parallel_updates)
             cd = OrderedDict()
             for cn, ci in six.iteritems(self._channels):
                 cd[cn] = ci.setup_model(**props)
@@ -1707,6 +2524,11 @@ class LayoutChannel(Channel):
             self.error(e)
         return self._mdl
 
+    def keep_warm(self):
+        """poll the data sources of the sub-channels (see BokehSession.keep_warm)"""
+        for c in self._channels.values():
+            c.keep_warm()
+
     def on_tabs_selection_change(self, attr, old, new):
         self.__update_tabs_selection()
 
@@ -1721,7 +2543,16 @@ class LayoutChannel(Channel):
             if self._tabs_widget:
                 self.__update_tabs_selection()
             else:
-                for c in self._channels.values():
+                # the channels out of the browser viewport are skipped (or down-rated)
+                now = time.time()
+                channels = [c for c in self._channels.values() if c.update_due(now)]
+                if self._parallel_updates:
+                    # I/O phase on the IOLoop thread (the data sources needn't be thread safe), compute phase of all
+                    # the channels on the workers pool, then update the document in one pass
+                    for c in channels:
+                        c.pull_update()
+                    WorkersPool.run([c.prepare_update for c in channels])
+                for c in channels:
                     c.update()
         except Exception as e:
             self.error(e)
@@ -1731,11 +2562,13 @@ class LayoutChannel(Channel):
 class DataStream(NotebookCellContent, DataStreamEventHandler):
     """data stream interface"""
 
-    def __init__(self, name, channels=None):
+    def __init__(self, name, channels=None, update_period=None):
         NotebookCellContent.__init__(self, name, logger=logging.getLogger(plots_module_logger_name))
         DataStreamEventHandler.__init__(self, name)
         # bokeh session
         self._session = None
+        # own update period in seconds - None means the one of the DataStreamer
+        self._update_period = update_period
         # channels
         self._channels = Children(self, Channel)
         self._channels.register_add_callback(self._on_add_channel)
@@ -1761,6 +2594,21 @@ class DataStream(NotebookCellContent, DataStreamEventHandler):
         for channel in self._channels.values():
             channel.output = new_output
 
+    @property
+    def channels(self):
+        """returns the dict of channels"""
+        return self._channels
+
+    @property
+    def update_period(self):
+        """returns the data stream own update period (in seconds) or None (i.e. the one of its DataStreamer)"""
+        return self._update_period
+
+    @update_period.setter
+    def update_period(self, up):
+        """set the data stream own update period (in seconds) or None to use the one of its DataStreamer"""
+        self._update_period = up
+
     def add(self, channels):
         """add the specified channels"""
         self._channels.add(channels)
@@ -1791,15 +2639,29 @@ class DataStream(NotebookCellContent, DataStreamEventHandler):
                 models.append(model)
         return models
 
-    def update(self):
-        """gives each Channel a chance to update itself (e.g. to update the ColumDataSources)"""
+    def update(self, channels=None):
+        """gives each Channel (or the specified ones) a chance to update itself (e.g. to update the ColumDataSources)"""
         # print("data stream: {} update".format(self.name))
+        now = time.time()
         for channel in self._channels.values():
+            if channels is not None and channel.name not in channels:
+                continue
+            # the channels out of the browser viewport are skipped (or down-rated)
+            if not channel.update_due(now):
+                continue
             try:
                 channel.update()
             except Exception as e:
                 self.error(e)
 
+    def keep_warm(self):
+        """asks each Channel to poll its data sources (see BokehSession.keep_warm)"""
+        for channel in self._channels.values():
+            try:
+                channel.keep_warm()
+            except Exception as e:
+                self.error(e)
+
     def cleanup(self):
         """asks each Channel to cleanup itself (e.g. release resources)"""
         for channel in self._channels.values():
@@ -1829,6 +2691,9 @@ class DataStreamer(NotebookCellContent, DataStreamEventHandler, BokehSession):
         # the data streams
         self._data_streams = list()
         self.add(data_streams)
+        # per data stream/channel update periods scheduler (see periodic_callback)
+        self._scheduler = PeriodicScheduler()
+        self._schedule_signature = None
         # auto start
         self._auto_start = auto_start
         # start delay
@@ -1878,6 +2743,10 @@ class DataStreamer(NotebookCellContent, DataStreamEventHandler, BokehSession):
         """close the session"""
         # suspend periodic callback
         self.pause()
+        if not self.ready:
+            # no document (e.g. no client connected): nothing to lock
+            self.__close()
+            return
         # the underlying actions will be performed under critical section
         self.safe_document_modifications(self.__close)
         
@@ -1982,12 +2851,67 @@ class DataStreamer(NotebookCellContent, DataStreamEventHandler, BokehSession):
 
     def periodic_callback(self):
         """the session periodic callback"""
+        signature = self.__schedule_signature()
+        if signature != self._schedule_signature:
+            self.__setup_schedule(signature)
+        if len(self._scheduler):
+            # some data streams or channels have their own update period
+            self._scheduler.run_due(tolerance=0.5 * self._scheduler.min_period)
+            return
         for ds in self._data_streams:
             try:
                 ds.update()
             except Exception as e:
                 self.error(e)
 
+    def keep_warm(self):
+        """keep the data streams polled while no client is connected (see BokehSession.keep_warm_period)"""
+        for ds in self._data_streams:
+            try:
+                ds.keep_warm()
+            except Exception as e:
+                self.error(e)
+
+    def __schedule_signature(self):
+        # the schedule has to be rebuilt when any of the update periods changes
+        signature = [self.callback_period]
+        for ds in self._data_streams:
+            periods = tuple([(cn, c.update_period) for cn, c in six.iteritems(ds.channels)])
+            signature.append((id(ds), ds.update_period, periods))
+        return tuple(signature)
+
+    def __setup_schedule(self, signature):
+        self._schedule_signature = signature
+        self._scheduler.clear()
+        custom = any([ds.update_period or any([c.update_period for c in ds.channels.values()])
+                      for ds in self._data_streams])
+        if custom:
+            for ds in self._data_streams:
+                ds_period = ds.update_period or self.callback_period
+                own = [cn for cn, c in six.iteritems(ds.channels) if c.update_period]
+                others = [cn for cn in ds.channels.keys() if cn not in own]
+                if others and ds_period:
+                    self._scheduler.add((id(ds), None), ds_period, self.__stream_updater(ds, others))
+                for cn in own:
+                    self._scheduler.add((id(ds), cn), ds.channels[cn].update_period, self.__stream_updater(ds, [cn]))
+        # the periodic callback has to run at least as fast as the fastest data stream/channel
+        self._set_tick_period(self._scheduler.min_period)
+
+    def __stream_updater(self, ds, channels):
+        def update_stream():
+            try:
+                ds.update(channels)
+            except Exception as e:
+                self.error(e)
+        return update_stream
+
+
+# ------------------------------------------------------------------------------
+def ipywidgets():
+    """returns the ipywidgets module - only imported when a controller is instanciated (faster import of this module)"""
+    import ipywidgets as ipw
+    return ipw
+
 
 # ------------------------------------------------------------------------------
 class DataStreamerController(NotebookCellContent, DataStreamEventHandler):
@@ -2021,14 +2945,14 @@ class DataStreamerController(NotebookCellContent, DataStreamEventHandler):
 
     @staticmethod
     def l01a(width='auto', *args, **kwargs):
-        return ipw.Layout(flex='0 1 auto', width=width, *args, **kwargs)
+        return ipywidgets().Layout(flex='0 1 auto', width=width, *args, **kwargs)
 
     @staticmethod
     def l11a(width='auto', *args, **kwargs):
-        return ipw.Layout(flex='1 1 auto', width=width, *args, **kwargs)
+        return ipywidgets().Layout(flex='1 1 auto', width=width, *args, **kwargs)
 
     def __setup_update_period_slider(self, data_streamer, **kwargs):
-        return ipw.FloatSlider(
+        return ipywidgets().FloatSlider(
             value=data_streamer.update_period,
             min=kwargs.get('min_refresh_period', 0.25),
             max=kwargs.get('max_refresh_period', 5.0),
@@ -2043,6 +2967,7 @@ class DataStreamerController(NotebookCellContent, DataStreamEventHandler):
         )
 
     def __setup_controls(self, data_streamer, **kwargs):
+        ipw = ipywidgets()
         self._error_area = None
         self._error_area_enabled = kwargs.get('error_area_enabled', True)
         if kwargs.get('up_slider_enabled', True):
@@ -2158,7 +3083,7 @@ class DataStreamerController(NotebookCellContent, DataStreamEventHandler):
         err = "Oops, the following error occurred:\n"
         err += err_desc
         if self._error_area is None:
-            self._error_area = ipw.Textarea(value=err, rows=3, layout=self.l11a()) 
+            self._error_area = ipywidgets().Textarea(value=err, rows=3, layout=self.l11a()) 
             with self._ea_output:
                 display(self._error_area)
         else:
@@ -0,0 +1,944 @@
+# ===========================================================================
+#  This file is part of the Tango Ecosystem
+#
+#  Copyright 2017-EOT Synchrotron SOLEIL, St.Aubin, France
+#
+#  This is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Lesser General Public License as published by the Free
+#  Software Foundation, either version 3 of the License, or (at your option)
+#  any later version.
+#
+#  This is distributed in the hope that it will be useful, but WITHOUT ANY
+#  WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for
+#  more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with This.  If not, see <http://www.gnu.org/licenses/>.
+# ===========================================================================
+
+from __future__ import print_function
+import math as mt
+import warnings
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+
+processing_module_logger_name = "fs.client.jupyter.processing"
+
+
+# ------------------------------------------------------------------------------
+def downsampling_factor(image_shape, size_threshold):
+    """returns the (integer) block size so that the downsampled image fits into size_threshold pixels - 1 means none"""
+    size = float(image_shape[0]) * float(image_shape[1])
+    if size <= size_threshold or size_threshold <= 0:
+        return 1
+    return int(mt.ceil(mt.sqrt(size / size_threshold)))
+
+
+# ------------------------------------------------------------------------------
+def nan_range(image):
+    """returns the (min, max) of the image ignoring NaN - None if there's no finite value"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        low, high = np.nanmin(image), np.nanmax(image)
+    if not np.isfinite(low) or not np.isfinite(high):
+        return None
+    return low, high
+
+
+# ------------------------------------------------------------------------------
+def strided_subsample(image, max_samples=65536):
+    """returns a strided view of the image containing at most (about) max_samples values - no copy"""
+    stride = max(1, int(mt.ceil(mt.sqrt(image.size / float(max_samples)))))
+    return image[::stride, ::stride] if image.ndim == 2 else image[::stride * stride]
+
+
+# ------------------------------------------------------------------------------
+def _reduce_blocks(blocks, func):
+    # blocks.shape is (ny, sy, nx, sx): reduce each (sy, sx) block
+    if func == 'max':
+        return blocks.max(axis=(1, 3))
+    if func == 'nanmax':
+        return np.nanmax(blocks, axis=(1, 3))
+    if func == 'nanmean':
+        return np.nanmean(blocks, axis=(1, 3), dtype=np.float32)
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+
+# ------------------------------------------------------------------------------
+block_reduce_functions = ['mean', 'max', 'nanmean', 'nanmax']
+
+
+# ------------------------------------------------------------------------------
+def nan_watermark(image):
+    """returns the num. of rows containing data in an image acquired row by row (i.e. NaN beyond the acquired rows)
+
+    binary search on 'the row is NaN only': O(width * log(height)) - only valid for images filled row by row
+    starting from the first one (e.g. partially acquired scans)
+    """
+    h = image.shape[0]
+    if not np.issubdtype(image.dtype, np.floating):
+        return h
+    lo, hi = 0, h
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if np.isnan(image[mid]).all():
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+# ------------------------------------------------------------------------------
+def block_reduce_shape(shape, factor):
+    """returns the shape of the image obtained by reducing an image of the specified shape (see block_reduce)"""
+    sy, sx = (factor, factor) if np.isscalar(factor) else factor
+    return -(-shape[0] // max(1, sy)), -(-shape[1] // max(1, sx))
+
+
+# ------------------------------------------------------------------------------
+def block_reduce_dtype(dtype, func='mean'):
+    """returns the dtype of the image obtained by reducing an image of the specified dtype (see block_reduce)"""
+    if not np.issubdtype(dtype, np.floating):
+        func = func[3:] if func.startswith('nan') else func
+    return dtype if func in ['max', 'nanmax'] else np.dtype(np.float32)
+
+
+# ------------------------------------------------------------------------------
+def block_reduce(image, factor, func='mean', filled_rows=None, out=None):
+    """downsample a 2D image by reducing each (factor x factor) block to its mean, max, nanmean or nanmax
+
+    the input is reduced in its native dtype (mean results are float32) through reshaped views, no interpolation
+    involved - trailing partial blocks are reduced too so that the output shape is ceil(image.shape / factor)
+
+    filled_rows: num. of (first) rows containing data (see nan_watermark) - blocks below are set to NaN without
+    being reduced, so that the cost is proportional to the acquired area of partially filled images
+
+    out: optional preallocated output array (see OutputBuffers) - must have the expected shape and dtype
+    """
+    if func not in block_reduce_functions:
+        raise ValueError("invalid reduction '{}' - expected one of {}".format(func, block_reduce_functions))
+    sy, sx = (factor, factor) if np.isscalar(factor) else factor
+    if sy <= 1 and sx <= 1:
+        return image
+    if not np.issubdtype(image.dtype, np.floating):
+        # no NaN in integer images: use the fast variants
+        func = func[3:] if func.startswith('nan') else func
+        filled_rows = None
+    h, w = image.shape
+    if filled_rows is not None and filled_rows < h:
+        # only reduce the blocks containing acquired rows
+        if out is None:
+            out = np.empty(block_reduce_shape(image.shape, (sy, sx)), dtype=block_reduce_dtype(image.dtype, func))
+        out_rows = -(-max(0, filled_rows) // sy)
+        out[out_rows:].fill(np.nan)
+        if out_rows:
+            block_reduce(image[:out_rows * sy], (sy, sx), func, out=out[:out_rows])
+        return out
+    ny, nx = h // sy, w // sx
+    ry, rx = h - ny * sy, w - nx * sx
+    if out is None:
+        out = np.empty(block_reduce_shape(image.shape, (sy, sx)), dtype=block_reduce_dtype(image.dtype, func))
+    with warnings.catch_warnings():
+        # all-NaN blocks are expected (e.g. partially acquired scans): they simply produce NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if ny and nx:
+            out[:ny, :nx] = _reduce_blocks(image[:ny * sy, :nx * sx].reshape(ny, sy, nx, sx), func)
+        if rx and ny:
+            out[:ny, nx:] = _reduce_blocks(image[:ny * sy, nx * sx:].reshape(ny, sy, 1, rx), func)
+        if ry and nx:
+            out[ny:, :nx] = _reduce_blocks(image[ny * sy:, :nx * sx].reshape(1, ry, nx, sx), func)
+        if ry and rx:
+            out[ny:, nx:] = _reduce_blocks(image[ny * sy:, nx * sx:].reshape(1, ry, 1, rx), func)
+    return out
+
+
+# ------------------------------------------------------------------------------
+regrid_functions = ['mean', 'max', 'min', 'first']
+
+
+# ------------------------------------------------------------------------------
+def pixel_edges(coordinates):
+    """returns the n + 1 edges of the pixels centered on the specified (increasing, possibly non uniform) coordinates"""
+    c = np.asarray(coordinates, dtype=np.float64)
+    if c.shape[0] < 2:
+        return np.array([c[0] - 0.5, c[0] + 0.5]) if c.shape[0] else np.zeros((1,))
+    mid = 0.5 * (c[1:] + c[:-1])
+    return np.concatenate(([2. * c[0] - mid[0]], mid, [2. * c[-1] - mid[-1]]))
+
+
+# ------------------------------------------------------------------------------
+def _regrid_plan(centers, out_edges):
+    # binning of the source pixels (centers) into the output pixels (edges) along one axis
+    bounds = np.searchsorted(centers, out_edges, side='left')
+    starts, ends = bounds[:-1], bounds[1:]
+    filled = ends > starts
+    # output pixels containing no source pixel center (i.e. upsampling): source pixel they lie in (if any)
+    out_centers = 0.5 * (out_edges[:-1] + out_edges[1:])
+    nearest = np.searchsorted(pixel_edges(centers), out_centers, side='right') - 1
+    nearest_ok = ~filled & (nearest >= 0) & (nearest < centers.shape[0])
+    used = np.concatenate((starts[filled], ends[filled] - 1, nearest[nearest_ok]))
+    if not used.size:
+        return None
+    lo, hi = int(used.min()), int(used.max()) + 1
+    # indexes are relative to the [lo, hi) crop of the source
+    return dict(lo=lo, hi=hi, size=out_edges.shape[0] - 1,
+                filled=np.flatnonzero(filled), starts=starts[filled] - lo,
+                end=int(ends[filled][-1]) - lo if filled.any() else 0,
+                nearest_bins=np.flatnonzero(nearest_ok), nearest=nearest[nearest_ok] - lo)
+
+
+# ------------------------------------------------------------------------------
+def _regrid_axis(data, plan, ufunc, axis):
+    # reduces the source pixels of each output pixel along the specified axis - ufunc None means 'first'
+    shape = list(data.shape)
+    shape[axis] = plan['size']
+    out = np.empty(shape, dtype=np.result_type(data.dtype, np.float32))
+    out.fill(np.nan)
+    index = [slice(None), slice(None)]
+    if plan['filled'].size:
+        index[axis] = slice(0, plan['end'])
+        part = data[tuple(index)]
+        if ufunc is None:
+            reduced = part.take(plan['starts'], axis=axis)
+        else:
+            reduced = ufunc.reduceat(part, plan['starts'], axis=axis)
+        index[axis] = plan['filled']
+        out[tuple(index)] = reduced
+    if plan['nearest_bins'].size:
+        index[axis] = plan['nearest_bins']
+        out[tuple(index)] = data.take(plan['nearest'], axis=axis)
+    return out
+
+
+# ------------------------------------------------------------------------------
+def regrid(image, x_coordinates, y_coordinates, x_range, y_range, shape, func='mean'):
+    """regrids a 2D image into the (shape[0] x shape[1]) pixels grid covering x_range x y_range (e.g. plot pixels)
+
+    x/y_coordinates: coordinates of the image columns/rows centers - monotonic but possibly non uniform
+    each output pixel is the reduction ('mean', 'max', 'min' or 'first') of the source pixels centered in it - NaN
+    are ignored by 'mean', 'max' and 'min'. When zooming beyond the source resolution, output pixels take the value
+    of the source pixel they lie in. Output pixels outside the image are NaN.
+
+    pure NumPy binning (searchsorted + reduceat): the cost is proportional to the visible part of the image
+    """
+    if func not in regrid_functions:
+        raise ValueError("invalid reduction '{}' - expected one of {}".format(func, regrid_functions))
+    h, w = int(shape[0]), int(shape[1])
+    xc = np.asarray(x_coordinates, dtype=np.float64)
+    yc = np.asarray(y_coordinates, dtype=np.float64)
+    if xc.shape[0] != image.shape[1] or yc.shape[0] != image.shape[0]:
+        raise ValueError("image shape {} doesn't match the coordinates sizes ({}, {})".format(image.shape,
+                                                                                           yc.shape[0],
+                                                                                           xc.shape[0]))
+    if xc.shape[0] > 1 and xc[-1] < xc[0]:
+        image, xc = image[:, ::-1], xc[::-1]
+    if yc.shape[0] > 1 and yc[-1] < yc[0]:
+        image, yc = image[::-1], yc[::-1]
+    xp = _regrid_plan(xc, np.linspace(min(x_range), max(x_range), w + 1))
+    yp = _regrid_plan(yc, np.linspace(min(y_range), max(y_range), h + 1))
+    if xp is None or yp is None:
+        out = np.empty((h, w), dtype=np.float32)
+        out.fill(np.nan)
+        return out
+    image = image[yp['lo']:yp['hi'], xp['lo']:xp['hi']]
+    if func == 'mean':
+        if np.issubdtype(image.dtype, np.floating):
+            finite = np.isfinite(image)
+            values = np.where(finite, image, 0.)
+            counts = finite.astype(np.float32)
+        else:
+            values = image.astype(np.float64)
+            counts = np.ones(image.shape, dtype=np.float32)
+        sums = _regrid_axis(_regrid_axis(values, yp, np.add, 0), xp, np.add, 1)
+        counts = _regrid_axis(_regrid_axis(counts, yp, np.add, 0), xp, np.add, 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = (sums / counts).astype(np.float32)
+    else:
+        ufunc = {'max': np.fmax, 'min': np.fmin, 'first': None}[func]
+        out = _regrid_axis(_regrid_axis(image, yp, ufunc, 0), xp, ufunc, 1)
+    if x_range[0] > x_range[1]:
+        out = out[:, ::-1]
+    if y_range[0] > y_range[1]:
+        out = out[::-1]
+    return out
+
+
+# ------------------------------------------------------------------------------
+class FrameAccumulator(object):
+    """running mean/sum/ewma over the last N frames (spectra or images)"""
+
+    modes = ['mean', 'sum', 'ewma']
+
+    def __init__(self, mode='mean', depth=10, alpha=None):
+        if mode not in FrameAccumulator.modes:
+            raise ValueError("invalid accumulation mode '{}' - expected one of {}".format(mode, FrameAccumulator.modes))
+        self._mode = mode
+        # num. of frames in the window (mean, sum)
+        self._depth = max(1, int(depth))
+        # smoothing factor (ewma) - defaults to the equivalent of a N frames window
+        self._alpha = float(alpha) if alpha is not None else 2. / (self._depth + 1.)
+        self.reset()
+
+    def reset(self):
+        self._acc = None  # float32 accumulator
+        self._out = None  # float32 output buffer (mean)
+        self._ring = None  # the last N frames (mean, sum)
+        self._index = 0  # next ring slot
+        self._count = 0  # num. of frames currently in the window
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @property
+    def depth(self):
+        return self._depth
+
+    @property
+    def count(self):
+        return self._count
+
+    def push(self, frame):
+        """push a new frame then return the accumulated one - the returned array is owned by the accumulator"""
+        if self._acc is None or self._acc.shape != frame.shape:
+            self.__allocate(frame.shape)
+        if self._mode == 'ewma':
+            return self.__push_ewma(frame)
+        slot = self._ring[self._index]
+        if self._count == self._depth:
+            # the oldest frame leaves the window
+            np.subtract(self._acc, slot, out=self._acc)
+        else:
+            self._count += 1
+        slot[...] = frame
+        np.add(self._acc, slot, out=self._acc)
+        self._index = (self._index + 1) % self._depth
+        if not self._index:
+            # the ring wrapped: get rid of the float32 rounding drift (and of any NaN that left the window)
+            np.sum(self._ring[:self._count], axis=0, dtype=np.float32, out=self._acc)
+        if self._mode == 'sum':
+            return self._acc
+        np.multiply(self._acc, np.float32(1. / self._count), out=self._out)
+        return self._out
+
+    def __push_ewma(self, frame):
+        if not self._count:
+            self._acc[...] = frame
+        else:
+            # acc += alpha * (frame - acc)
+            np.subtract(frame, self._acc, out=self._out)
+            self._out *= np.float32(self._alpha)
+            self._acc += self._out
+        self._count = min(self._count + 1, self._depth)
+        return self._acc
+
+    def __allocate(self, shape):
+        self.reset()
+        self._acc = np.zeros(shape, dtype=np.float32)
+        self._out = np.zeros(shape, dtype=np.float32)
+        if self._mode != 'ewma':
+            self._ring = np.zeros((self._depth,) + tuple(shape), dtype=np.float32)
+
+    @staticmethod
+    def from_properties(props):
+        """instanciate a FrameAccumulator from the 'accumulation*' model properties - returns None if disabled"""
+        mode = props.get('accumulation', None)
+        if not mode:
+            return None
+        depth = props.get('accumulation_depth', 10)
+        alpha = props.get('accumulation_alpha', None)
+        return FrameAccumulator(mode, depth, alpha)
+
+
+# ------------------------------------------------------------------------------
+class ImagePyramid(object):
+    """lazily built power-of-two multi-resolution pyramid of an image"""
+
+    def __init__(self, func='mean'):
+        # block reduction function (see block_reduce)
+        self._func = func
+        self._levels = list()
+
+    def set_frame(self, frame):
+        """drop the current pyramid - level 0 is the specified frame (no copy), others are built on demand"""
+        self._levels = [frame] if frame is not None else list()
+
+    @property
+    def frame(self):
+        return self._levels[0] if len(self._levels) else None
+
+    @property
+    def num_levels(self):
+        """returns the number of levels built so far"""
+        return len(self._levels)
+
+    def level(self, index):
+        """returns the specified level (i.e. the frame downsampled by 2**index) - the closest one if unreachable"""
+        while len(self._levels) <= index:
+            prev = self._levels[-1]
+            if prev.shape[0] < 2 or prev.shape[1] < 2:
+                break
+            self._levels.append(block_reduce(prev, 2, self._func))
+        return self._levels[min(index, len(self._levels) - 1)]
+
+    @staticmethod
+    def level_for_size(height, width, size_threshold):
+        """returns the lowest level at which an height x width region fits into size_threshold pixels"""
+        size = float(height) * float(width)
+        if size <= size_threshold or size_threshold <= 0:
+            return 0
+        return int(np.ceil(0.5 * np.log2(size / size_threshold)))
+
+    def extract(self, ysi, yei, xsi, xei, size_threshold):
+        """crop the [ysi:yei, xsi:xei] full resolution region from the appropriate level"""
+        ysi, xsi = max(0, ysi), max(0, xsi)
+        k = self.level_for_size(yei - ysi, xei - xsi, size_threshold)
+        image = self.level(k)
+        s = 1 << min(k, len(self._levels) - 1)
+        return image[ysi // s:-(-yei // s), xsi // s:-(-xei // s)]
+
+
+# ------------------------------------------------------------------------------
+def rgba_color(color):
+    """returns the (r, g, b, a) bytes of the specified color: '#RRGGBB', '#RRGGBBAA', '#RGB', a named (CSS) color or
+    a (r, g, b) / (r, g, b, a) tuple, alpha being a float in [0, 1] (bokeh convention) - raises a ValueError otherwise
+    """
+    if isinstance(color, (tuple, list)) and len(color) in (3, 4):
+        r, g, b = [int(c) for c in color[:3]]
+        a = int(round(255 * float(color[3]))) if len(color) == 4 else 255
+        if all([0 <= c <= 255 for c in (r, g, b, a)]):
+            return r, g, b, a
+    elif isinstance(color, str) or (not isinstance(color, bytes) and hasattr(color, 'lower')):
+        hex_color = color.lstrip('#')
+        if color.startswith('#') and len(hex_color) == 3:
+            hex_color = ''.join([c * 2 for c in hex_color])
+        if color.startswith('#') and len(hex_color) in (6, 8):
+            try:
+                rgba = [int(hex_color[i:i + 2], 16) for i in range(0, len(hex_color), 2)]
+                return tuple(rgba) if len(rgba) == 4 else tuple(rgba + [255])
+            except ValueError:
+                pass
+        elif not color.startswith('#'):
+            try:
+                # named colors are only known by bokeh (imported on demand)
+                from bokeh.colors import named
+                nc = getattr(named, color.lower())
+                return nc.r, nc.g, nc.b, 255
+            except (ImportError, AttributeError):
+                pass
+    raise ValueError("invalid palette color: {!r} - expected '#RRGGBB', '#RGB', a named color or a (r, g, b) "
+                     "tuple".format(color))
+
+
+# ------------------------------------------------------------------------------
+class RgbaColorMapper(object):
+    """maps images to packed RGBA (uint32) images through a palette lookup table - LUTs are shared by all instances"""
+
+    __luts__ = dict()
+    __luts_lock__ = Lock()
+
+    def __init__(self, palette, low=None, high=None, nan_color=(0, 0, 0, 0)):
+        # the palette LUT (last entry is the NaN color)
+        self._lut = RgbaColorMapper.lut(palette, nan_color)
+        # mapping range - None means 'auto' (i.e. image min/max)
+        self.low = low
+        self.high = high
+        # the range actually used by the last mapping
+        self._last_range = None
+
+    @property
+    def last_range(self):
+        return self._last_range
+
+    @staticmethod
+    def lut(palette, nan_color=(0, 0, 0, 0)):
+        """returns the (cached) packed RGBA lookup table associated with the specified palette"""
+        colors = tuple([rgba_color(color) for color in palette])
+        if not colors:
+            raise ValueError("invalid palette: no color")
+        key = (colors, tuple(nan_color))
+        with RgbaColorMapper.__luts_lock__:
+            lut = RgbaColorMapper.__luts__.get(key, None)
+            if lut is None:
+                rgba = np.zeros((len(colors) + 1, 4), dtype=np.uint8)
+                rgba[:-1] = colors
+                rgba[-1] = nan_color
+                # rgba bytes order is preserved whatever the platform endianness
+                lut = RgbaColorMapper.__luts__[key] = rgba.view(np.uint32).ravel()
+        return lut
+
+    def map(self, image, low=None, high=None, out=None):
+        """returns the packed RGBA (uint32) counterpart of the specified image
+
+        out: optional preallocated uint32 output array of the same shape as image (see OutputBuffers)
+        """
+        low = low if low is not None else self.low
+        high = high if high is not None else self.high
+        if low is None or high is None:
+            image_range = nan_range(image)
+            image_range = image_range if image_range is not None else (0., 1.)
+            low = image_range[0] if low is None else low
+            high = image_range[1] if high is None else high
+        self._last_range = (low, high)
+        n = self._lut.shape[0] - 1
+        # same binning as bokeh's LinearColorMapper: n bins of equal width, 'high' falls into the last one
+        scale = n / float(high - low) if high != low else 0.
+        # normalization in float32 then LUT indexes
+        norm = np.subtract(image, low, dtype=np.float32)
+        norm *= np.float32(scale)
+        nan_mask = np.isnan(norm)
+        np.clip(norm, 0, n - 1, out=norm)
+        norm[nan_mask] = n
+        return self._lut.take(norm.astype(np.intp), out=out)
+
+
+# ------------------------------------------------------------------------------
+class TileDeltaEncoder(object):
+    """splits images into fixed size tiles and tells which ones changed since the last sent image"""
+
+    def __init__(self, tile_size=64, full_refresh_period=10, max_dirty_ratio=0.5):
+        # tile size in pixels
+        self._tile_size = max(1, int(tile_size))
+        # a full image is sent every 'full_refresh_period' frames
+        self._full_refresh_period = max(1, int(full_refresh_period))
+        # above this ratio of dirty tiles, sending the full image is cheaper
+        self.max_dirty_ratio = max_dirty_ratio
+        self.reset()
+
+    @property
+    def max_dirty_ratio(self):
+        """returns the ratio of dirty tiles above which the full image is sent"""
+        return self._max_dirty_ratio
+
+    @max_dirty_ratio.setter
+    def max_dirty_ratio(self, ratio):
+        """set the ratio of dirty tiles above which the full image is sent - in [0, 1]"""
+        ratio = float(ratio)
+        if not 0. <= ratio <= 1.:
+            raise ValueError("invalid max. dirty tiles ratio: {} - expected a value in [0, 1]".format(ratio))
+        self._max_dirty_ratio = ratio
+
+    def reset(self):
+        """forget the last sent image: next call to encode will request a full refresh"""
+        self._reference = None
+        self._count = 0
+
+    @property
+    def reference(self):
+        """the image as seen by the client"""
+        return self._reference
+
+    def encode(self, image, owned=False):
+        """returns (True, image to send) for a full refresh or (False, list of dirty tiles (ys, ye, xs, xe))
+
+        the image returned for a full refresh is owned by the encoder: it is updated in place with the dirty
+        tiles of the following frames, so that it can be handed over to the ColumnDataSource and patched there
+
+        owned: the caller hands the image over (i.e. won't reuse it): it becomes the reference without being copied
+        """
+        ref = self._reference
+        self._count = (self._count + 1) % self._full_refresh_period
+        if ref is None or ref.shape != image.shape or ref.dtype != image.dtype or not self._count:
+            self._reference = image if owned else np.array(image, copy=True)
+            self._count = 0
+            return True, self._reference
+        changed = ref != image
+        if np.issubdtype(image.dtype, np.floating):
+            # NaN != NaN: unchanged NaN pixels are not dirty
+            changed &= ~(np.isnan(ref) & np.isnan(image))
+        ts = self._tile_size
+        dirty = block_reduce(changed.view(np.uint8), ts, 'max') if ts > 1 else changed
+        tiles = np.argwhere(dirty)
+        if tiles.shape[0] > self._max_dirty_ratio * dirty.size:
+            # a new array object: the previous reference is held by the consumer, which wouldn't notice the change
+            self._reference = image if owned else np.array(image, copy=True)
+            self._count = 0
+            return True, self._reference
+        dirty_tiles = list()
+        for ty, tx in tiles:
+            ys, xs = int(ty) * ts, int(tx) * ts
+            ye, xe = min(ys + ts, image.shape[0]), min(xs + ts, image.shape[1])
+            ref[ys:ye, xs:xe] = image[ys:ye, xs:xe]
+            dirty_tiles.append((ys, ye, xs, xe))
+        return False, dirty_tiles
+
+    @staticmethod
+    def from_properties(props):
+        """instanciate a TileDeltaEncoder from the 'tile_delta*' model properties - returns None if disabled"""
+        if not props.get('tile_delta', False):
+            return None
+        return TileDeltaEncoder(props.get('tile_delta_size', 64),
+                                props.get('tile_delta_full_refresh_period', 10),
+                                props.get('tile_delta_max_dirty_ratio', 0.5))
+
+
+# ------------------------------------------------------------------------------
+class OutputBuffers(object):
+    """preallocated output buffers (e.g. images handed over to a ColumnDataSource) reused from one frame to the next
+
+    the buffer still held by the consumer ('busy') is never returned: it might be in use and a new array object
+    is required for the consumer to notice the change - two buffers are thus enough to avoid any allocation
+
+    a buffer is consequently rewritten while a previous version of it might still be referenced by the consumer:
+    this is only safe if the consumer is done with a buffer once it holds the next one - e.g. a ColumnDataSource,
+    for which bokeh serializes (i.e. copies) the new data synchronously, in the ColumnDataSource.data change
+    notification, before the next buffer can be handed over
+    """
+
+    def __init__(self, count=2):
+        self._buffers = [None] * max(2, int(count))
+
+    def reset(self):
+        """releases the buffers"""
+        self._buffers = [None] * len(self._buffers)
+
+    @property
+    def nbytes(self):
+        return sum([b.nbytes for b in self._buffers if b is not None])
+
+    def get(self, shape, dtype, busy=None):
+        """returns a (non initialized) buffer of the specified shape and dtype which is not the 'busy' one"""
+        shape, dtype = tuple(shape), np.dtype(dtype)
+        candidates = [i for i, b in enumerate(self._buffers) if b is None or b is not busy]
+        for i in candidates:
+            b = self._buffers[i]
+            if b is not None and b.shape == shape and b.dtype == dtype:
+                break
+        else:
+            i = candidates[0]
+            self._buffers[i] = np.empty(shape, dtype=dtype)
+        # never hand over the array (or a view of the array) the consumer currently holds
+        assert busy is None or not np.may_share_memory(self._buffers[i], busy)
+        return self._buffers[i]
+
+
+# ------------------------------------------------------------------------------
+class ImageEncoder(object):
+    """encodes packed RGBA images (see RgbaColorMapper) as PNG (lossless), JPEG or WebP (lossy) data URIs
+
+    requires Pillow - imported on instanciation so that it remains an optional dependency
+    """
+
+    formats = {'png': ('PNG', 'image/png'), 'jpeg': ('JPEG', 'image/jpeg'), 'webp': ('WEBP', 'image/webp')}
+
+    def __init__(self, format='png', quality=85):
+        if format not in ImageEncoder.formats:
+            raise ValueError("invalid image format '{}' - expected one of {}".format(format,
+                                                                                   sorted(ImageEncoder.formats)))
+        try:
+            from PIL import Image
+        except ImportError:
+            raise ImportError("images encoding requires Pillow (e.g. pip install pillow)")
+        self._pil_image = Image
+        self._format = format
+        # lossy formats quality (1 to 100)
+        self._quality = max(1, min(100, int(quality)))
+        # num. of bytes of the last encoded image
+        self._last_size = 0
+
+    @property
+    def format(self):
+        return self._format
+
+    @property
+    def last_size(self):
+        return self._last_size
+
+    def encode(self, rgba):
+        """returns the data URI of the specified packed RGBA (uint32) image - row 0 is the bottom one (Bokeh)"""
+        h, w = rgba.shape
+        pixels = np.ascontiguousarray(rgba[::-1]).view(np.uint8).reshape(h, w, 4)
+        pil_format, mime_type = ImageEncoder.formats[self._format]
+        kwargs = dict()
+        if self._format == 'png':
+            # real time: favor encoding speed over size
+            kwargs['compress_level'] = 1
+            image = self._pil_image.fromarray(pixels, 'RGBA')
+        else:
+            kwargs['quality'] = self._quality
+            # no alpha channel in JPEG (NaN pixels become black)
+            mode = 'RGB' if self._format == 'jpeg' else 'RGBA'
+            image = self._pil_image.fromarray(pixels if mode == 'RGBA' else pixels[:, :, :3], mode)
+        import base64
+        import io
+        buf = io.BytesIO()
+        image.save(buf, format=pil_format, **kwargs)
+        data = buf.getvalue()
+        self._last_size = len(data)
+        return "data:{};base64,{}".format(mime_type, base64.b64encode(data).decode('ascii'))
+
+
+# ------------------------------------------------------------------------------
+class TilePyramid(object):
+    """on-demand power-of-two tiles pyramid of a (very large) image with a size-bounded LRU tiles cache
+
+    a tile of level k covers (tile_size * 2**k)**2 pixels of the full resolution image; it is obtained by
+    reducing the 4 tiles of level k-1 it covers, so that each tile is computed at most once per frame
+    """
+
+    def __init__(self, tile_size=256, cache_size=64 * 1024 * 1024, func='mean'):
+        # tile size (must be even so that tiles boundaries are preserved from one level to the next)
+        self._tile_size = max(2, int(tile_size) + int(tile_size) % 2)
+        # max. num of bytes in the cache
+        self._cache_size = int(cache_size)
+        # block reduction function (see block_reduce)
+        self._func = func
+        # LRU tiles cache: (level, ty, tx) -> tile
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._frame = None
+        self._num_levels = 0
+
+    @property
+    def tile_size(self):
+        return self._tile_size
+
+    @property
+    def frame(self):
+        return self._frame
+
+    @property
+    def num_levels(self):
+        return self._num_levels
+
+    @property
+    def cache_bytes(self):
+        return self._cache_bytes
+
+    def set_frame(self, frame):
+        """new frame: drop the cached tiles (no copy of the frame)"""
+        self._frame = frame
+        self._cache.clear()
+        self._cache_bytes = 0
+        self._num_levels = 0
+        if frame is not None:
+            h, w = frame.shape
+            self._num_levels = 1
+            while h > self._tile_size or w > self._tile_size:
+                h, w = -(-h // 2), -(-w // 2)
+                self._num_levels += 1
+
+    def level_shape(self, level):
+        h, w = self._frame.shape
+        for _ in range(level):
+            h, w = -(-h // 2), -(-w // 2)
+        return h, w
+
+    def level_for_size(self, height, width, size_threshold):
+        """returns the level at which an height x width full resolution region fits into size_threshold pixels"""
+        return min(ImagePyramid.level_for_size(height, width, size_threshold), self._num_levels - 1)
+
+    def visible_tiles(self, level, ysi, yei, xsi, xei):
+        """returns the (ty, tx) indexes of the tiles of the specified level covering the [ysi:yei, xsi:xei] region"""
+        s = self._tile_size << level
+        h, w = self._frame.shape
+        ysi, xsi = max(0, ysi), max(0, xsi)
+        yei, xei = min(yei, h), min(xei, w)
+        return [(ty, tx) for ty in range(ysi // s, -(-yei // s)) for tx in range(xsi // s, -(-xei // s))]
+
+    def tile_extent(self, level, ty, tx):
+        """returns the (ys, ye, xs, xe) full resolution region covered by the specified tile"""
+        s = self._tile_size << level
+        h, w = self._frame.shape
+        return ty * s, min((ty + 1) * s, h), tx * s, min((tx + 1) * s, w)
+
+    def tile(self, level, ty, tx):
+        """returns the specified tile (from the cache when possible)"""
+        key = (level, ty, tx)
+        tile = self._cache.pop(key, None)
+        if tile is None:
+            tile = self.__compute_tile(level, ty, tx)
+            self._cache_bytes += tile.nbytes
+        # most recently used tiles are at the end of the cache
+        self._cache[key] = tile
+        while self._cache_bytes > self._cache_size and len(self._cache) > 1:
+            _, lru_tile = self._cache.popitem(last=False)
+            self._cache_bytes -= lru_tile.nbytes
+        return tile
+
+    def __compute_tile(self, level, ty, tx):
+        ts = self._tile_size
+        if not level:
+            return np.array(self._frame[ty * ts:(ty + 1) * ts, tx * ts:(tx + 1) * ts], copy=True)
+        # reduce the (up to) 4 tiles of the previous level covering this one
+        ph, pw = self.level_shape(level - 1)
+        rows = list()
+        for cty in range(2 * ty, min(2 * ty + 2, -(-ph // ts))):
+            row = [self.tile(level - 1, cty, ctx) for ctx in range(2 * tx, min(2 * tx + 2, -(-pw // ts)))]
+            rows.append(np.hstack(row) if len(row) > 1 else row[0])
+        children = np.vstack(rows) if len(rows) > 1 else rows[0]
+        return block_reduce(children, 2, self._func)
+
+
+# ------------------------------------------------------------------------------
+class AutoContrast(object):
+    """robust (percentiles based) contrast computed from a fixed-bins histogram of a strided frame subsample
+
+    the histogram is updated incrementally (exponential decay) and the returned range only changes when the
+    percentiles move by more than 'hysteresis' times the current range (so that the color mapper is left alone)
+    """
+
+    def __init__(self, low_percentile=1., high_percentile=99., bins=1024, max_samples=65536, decay=0.5, hysteresis=0.02):
+        self._low_percentile = float(low_percentile)
+        self._high_percentile = float(high_percentile)
+        self._bins = int(bins)
+        self._max_samples = int(max_samples)
+        self._decay = float(decay)
+        self._hysteresis = float(hysteresis)
+        self.reset()
+
+    def reset(self):
+        self._hist = None  # decayed histogram
+        self._edges = None  # histogram (fixed) range: (min, max)
+        self._range = None  # current (low, high) contrast
+
+    @property
+    def range(self):
+        """return the current (low, high) contrast or None if unknown"""
+        return self._range
+
+    def __subsample(self, frame):
+        sample = strided_subsample(frame, self._max_samples)
+        if np.issubdtype(sample.dtype, np.floating):
+            sample = sample[np.isfinite(sample)]
+        return sample
+
+    def update(self, frame):
+        """update the contrast with the specified frame - return True if the contrast changed, False otherwise"""
+        sample = self.__subsample(frame)
+        if not sample.size:
+            return False
+        low, high = self.__percentiles(sample)
+        if low is None:
+            # the histogram range doesn't contain the percentiles: restart from the sample (robust) range
+            self.__reset_edges(sample)
+            low, high = self.__percentiles(sample)
+            if low is None:
+                return False
+        if self._range is not None:
+            tolerance = self._hysteresis * (self._range[1] - self._range[0])
+            if abs(low - self._range[0]) <= tolerance and abs(high - self._range[1]) <= tolerance:
+                return False
+        self._range = (float(low), float(high))
+        return True
+
+    def __reset_edges(self, sample):
+        # a few outliers (e.g. hot pixels) must not widen the bins: outliers fall into the first/last bins
+        lo, hi = np.percentile(sample, [self._low_percentile / 2., 50. + self._high_percentile / 2.])
+        margin = 0.5 * float(hi - lo) if hi != lo else 1.
+        self._edges = (float(lo) - margin, float(hi) + margin)
+        self._hist = None
+
+    def __percentiles(self, sample):
+        if self._edges is None:
+            return None, None
+        lo, hi = self._edges
+        indexes = (sample - lo) * (self._bins / (hi - lo))
+        np.clip(indexes, 0, self._bins - 1, out=indexes)
+        hist = np.bincount(indexes.astype(np.intp).ravel(), minlength=self._bins).astype(np.float64)
+        if self._hist is None:
+            self._hist = hist
+        else:
+            self._hist *= self._decay
+            self._hist += hist
+        cdf = np.cumsum(self._hist)
+        cdf /= cdf[-1]
+        low_bin = np.searchsorted(cdf, self._low_percentile / 100.)
+        high_bin = np.searchsorted(cdf, self._high_percentile / 100.)
+        if low_bin == 0 or high_bin >= self._bins - 1:
+            return None, None
+        bin_width = (hi - lo) / self._bins
+        return lo + bin_width * low_bin, lo + bin_width * (high_bin + 1)
+
+    @staticmethod
+    def from_properties(props):
+        """instanciate an AutoContrast from the 'auto_contrast*' model properties - returns None if disabled"""
+        if not props.get('auto_contrast', False):
+            return None
+        low, high = props.get('auto_contrast_percentiles', (1., 99.))
+        return AutoContrast(low, high, hysteresis=props.get('auto_contrast_hysteresis', 0.02))
+
+
+# ------------------------------------------------------------------------------
+class SummedAreaTables(object):
+    """summed-area tables (sum, sum of squares and NaN-free pixels count) of an image
+
+    built in one vectorized pass - then any rectangular region statistics are obtained in constant time
+    """
+
+    def __init__(self, image):
+        data = np.asarray(image, dtype=np.float64)
+        finite = np.isfinite(data)
+        has_nan = not finite.all()
+        if has_nan:
+            data = np.where(finite, data, 0.)
+        self._sum = self.__table(data)
+        self._sum2 = self.__table(data * data)
+        # pixels count (only required if some pixels are NaN)
+        self._count = self.__table(finite.astype(np.int32)) if has_nan else None
+        self._shape = data.shape
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @staticmethod
+    def __table(data):
+        table = np.zeros((data.shape[0] + 1, data.shape[1] + 1), dtype=data.dtype)
+        np.cumsum(data, axis=0, out=table[1:, 1:])
+        np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+        return table
+
+    @staticmethod
+    def __region_sum(table, ysi, yei, xsi, xei):
+        return table[yei, xei] - table[ysi, xei] - table[yei, xsi] + table[ysi, xsi]
+
+    def statistics(self, ysi, yei, xsi, xei):
+        """returns the count, sum, mean and std of the [ysi:yei, xsi:xei] region (NaN ignored)"""
+        h, w = self._shape
+        ysi, yei = max(0, min(ysi, h)), max(0, min(yei, h))
+        xsi, xei = max(0, min(xsi, w)), max(0, min(xei, w))
+        if ysi >= yei or xsi >= xei:
+            count = 0
+        elif self._count is None:
+            count = (yei - ysi) * (xei - xsi)
+        else:
+            count = int(self.__region_sum(self._count, ysi, yei, xsi, xei))
+        if not count:
+            return dict(count=0, sum=0., mean=np.nan, std=np.nan)
+        s = float(self.__region_sum(self._sum, ysi, yei, xsi, xei))
+        s2 = float(self.__region_sum(self._sum2, ysi, yei, xsi, xei))
+        mean = s / count
+        return dict(count=count, sum=s, mean=mean, std=mt.sqrt(max(0., s2 / count - mean * mean)))
+
+
+# ------------------------------------------------------------------------------
+class WorkersPool(object):
+    """process wide pool of worker threads shared by the image channels (see LayoutChannel)
+
+    NumPy releases the GIL for most array operations, so that the frames of several channels are actually
+    processed concurrently - the pool is created on first use
+    """
+
+    __pool__ = None
+    __pool_lock__ = Lock()
+
+    @staticmethod
+    def instance():
+        with WorkersPool.__pool_lock__:
+            if WorkersPool.__pool__ is None:
+                # multiprocessing is only imported when the pool is actually required
+                from multiprocessing import cpu_count
+                from multiprocessing.pool import ThreadPool
+                WorkersPool.__pool__ = ThreadPool(max(2, cpu_count()))
+            return WorkersPool.__pool__
+
+    @staticmethod
+    def run(tasks):
+        """runs the specified callables concurrently and returns their results once all of them are done"""
+        tasks = list(tasks)
+        if len(tasks) < 2:
+            return [task() for task in tasks]
+        return WorkersPool.instance().map(lambda task: task(), tasks)
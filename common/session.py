@@ -21,6 +21,7 @@ from __future__ import print_function
 
 import logging
 import socket
+import time
 from threading import Lock
 from uuid import uuid4
 
@@ -31,12 +32,10 @@ from tornado.ioloop import IOLoop
 from bokeh.io.state import curstate
 from bokeh.io import output_notebook
 from bokeh.resources import Resources
-from bokeh.application import Application
-from bokeh.application.handlers import Handler, FunctionHandler
+from bokeh.application.handlers import Handler
 from bokeh.embed import server_document
+from bokeh.models import ColumnDataSource, CustomJS, LayoutDOM
 from bokeh.io.notebook import EXEC_MIME_TYPE, HTML_MIME_TYPE
-
-from bokeh.server.server import Server
         
 try:
     from fs.client.jupyter.tools import JupyterContext, get_jupyter_context, NotebookCellContent
@@ -48,10 +47,27 @@ except:
         
 session_module_logger_name = "fs.client.jupyter.session"
 
-output_notebook(Resources(mode='inline', components=["bokeh", "bokeh-gl"]), hide_banner=True)
-    
+# has BokehJS been injected into the notebook? (see inject_bokeh_resources)
+__bokeh_resources_injected__ = False
+__bokeh_resources_lock__ = Lock()
+
+
+# ------------------------------------------------------------------------------
+def inject_bokeh_resources():
+    """embeds BokehJS into the notebook - done once, on first BokehSession.open, rather than at import time"""
+    global __bokeh_resources_injected__
+    with __bokeh_resources_lock__:
+        if not __bokeh_resources_injected__:
+            output_notebook(Resources(mode='inline', components=["bokeh", "bokeh-gl"]), hide_banner=True)
+            __bokeh_resources_injected__ = True
+
 # ------------------------------------------------------------------------------
 class BokehSessionHandler(Handler):
+    def __init__(self, server=None, *args, **kwargs):
+        super(BokehSessionHandler, self).__init__(*args, **kwargs)
+        # the BokehServer the handler is attached to (optional)
+        self._server = server
+
     def on_server_loaded(self, server_context):
         pass
 
@@ -59,15 +75,193 @@ class BokehSessionHandler(Handler):
         pass
 
     def on_session_created(self, session_context):
-        pass
+        if self._server is not None:
+            self._server.on_session_created(session_context)
 
     def on_session_destroyed(self, session_context):
-        pass
+        if self._server is not None:
+            self._server.on_session_destroyed(session_context)
 
     def modify_document(self, doc):
         return doc
 
 
+# ------------------------------------------------------------------------------
+class BokehSessionServerProxy(object):
+    """what the bokeh jupyter extension sees as 'the server' of a BokehSession output (JupyterLab)
+
+    the extension stops the server of an output when the output is cleared or re-run: since the bokeh server is
+    shared by all the sessions (see BokehServer), each session registers its own proxy which only closes the session
+    """
+
+    def __init__(self, session):
+        self._session = session
+
+    def get_sessions(self, *args, **kwargs):
+        """returns the bokeh server session(s) of the BokehSession (the extension looks for the document roots)"""
+        server, bsid = self._session.server, self._session.bokeh_session_id
+        if server is None or bsid is None:
+            return list()
+        return [s for s in server.get_sessions('/') if s.id == bsid]
+
+    def stop(self, *args, **kwargs):
+        self._session.close()
+
+
+# ------------------------------------------------------------------------------
+class BokehServer(object):
+    """kernel wide bokeh server multiplexing all the BokehSessions
+
+    a single application is served: each BokehSession registers itself under its uuid, which is passed as a request
+    argument by the script displayed in the notebook (see BokehSession.open), so that the application entry point
+    can bind the freshly created document to its session - sessions are added and removed at runtime
+    """
+
+    __instance__ = None
+    __instance_lock__ = Lock()
+
+    # name of the request argument carrying the BokehSession uuid
+    session_argument = 'bokeh_session'
+
+    # opt-in: delay (in ms) after which a bokeh server session without connection is destroyed & check interval
+    # (the sooner a session is destroyed, the sooner its BokehSession knows it has no client left) - None means the
+    # bokeh default - must be set before the server is started
+    unused_session_lifetime = None
+    check_unused_sessions = None
+
+    def __init__(self):
+        self._logger = logging.getLogger(session_module_logger_name)
+        # registered sessions: BokehSession.uuid -> BokehSession
+        self._sessions = dict()
+        # bokeh server sessions: bokeh session id -> BokehSession
+        self._bokeh_sessions = dict()
+        self._lock = Lock()
+        self._server = None
+        self._url = None
+
+    @staticmethod
+    def instance():
+        """returns the kernel wide bokeh server - started on first call"""
+        with BokehServer.__instance_lock__:
+            if BokehServer.__instance__ is None:
+                server = BokehServer()
+                server.__start()
+                BokehServer.__instance__ = server
+            return BokehServer.__instance__
+
+    @staticmethod
+    def prewarm():
+        """start the kernel wide bokeh server (and resolve the host address) ahead of the first BokehSession.open
+
+        optional: the server is otherwise started by the first session opened - calling this beforehand (e.g. in
+        the notebook first cell) makes the first monitor open as fast as the next ones
+        """
+        return BokehServer.instance()
+
+    @staticmethod
+    def host_address():
+        """returns the address of the host"""
+        return socket.gethostbyname(socket.gethostname())
+
+    @staticmethod
+    def running():
+        """returns True if the kernel wide bokeh server has been started, returns False otherwise"""
+        with BokehServer.__instance_lock__:
+            return BokehServer.__instance__ is not None
+
+    @property
+    def server(self):
+        return self._server
+
+    @property
+    def url(self):
+        return self._url
+
+    @property
+    def sessions(self):
+        """returns the uuids of the registered sessions"""
+        with self._lock:
+            return list(self._sessions.keys())
+
+    def __start(self):
+        bslg = logging.getLogger('bokeh.server.util')
+        bsll = bslg.getEffectiveLevel()
+        bslg.setLevel(logging.ERROR)
+        try:
+            # the server machinery is only imported when actually required
+            from bokeh.application import Application
+            from bokeh.application.handlers import FunctionHandler
+            from bokeh.server.server import Server
+            app = Application(FunctionHandler(self.__entry_point))
+            app.add(BokehSessionHandler(self))
+            kwargs = dict(io_loop=IOLoop.instance(), port=0, allow_websocket_origin=['*'])
+            if BokehServer.unused_session_lifetime is not None:
+                kwargs['unused_session_lifetime_milliseconds'] = BokehServer.unused_session_lifetime
+            if BokehServer.check_unused_sessions is not None:
+                kwargs['check_unused_sessions_milliseconds'] = BokehServer.check_unused_sessions
+            self._server = Server({'/': app}, **kwargs)
+            srv_addr = self._server.address if self._server.address else BokehServer.host_address()
+            self._url = 'http://{}:{}/'.format(srv_addr, self._server.port)
+            self._server.start()
+        finally:
+            bslg.setLevel(bsll)
+
+    def add_session(self, session):
+        """register the specified BokehSession - returns the arguments to pass to server_document"""
+        with self._lock:
+            self._sessions[session.uuid] = session
+        return {BokehServer.session_argument: session.uuid}
+
+    def remove_session(self, session):
+        """unregister the specified BokehSession"""
+        with self._lock:
+            if self._sessions.get(session.uuid, None) is session:
+                del self._sessions[session.uuid]
+            for bsid in [k for k, v in self._bokeh_sessions.items() if v is session]:
+                del self._bokeh_sessions[bsid]
+
+    def __bind(self, session_context):
+        # bind the bokeh server session to the BokehSession registered under the uuid passed as request argument
+        uuid = session_context.request.arguments.get(BokehServer.session_argument, [b''])[0]
+        uuid = uuid.decode('utf-8') if isinstance(uuid, bytes) else uuid
+        with self._lock:
+            session = self._sessions.get(uuid, None)
+            if session is not None:
+                self._bokeh_sessions[session_context.id] = session
+        return uuid, session
+
+    def __entry_point(self, doc):
+        try:
+            uuid, session = self.__bind(doc.session_context)
+            if session is None:
+                self._logger.warning("BokehServer: no session registered under uuid '{}'".format(uuid))
+            else:
+                session._attach_document(doc)
+        except Exception as e:
+            self._logger.error(e)
+        finally:
+            return doc
+
+    def on_session_created(self, session_context):
+        """called when a bokeh server session is created (i.e. a client connects) - before the entry point"""
+        try:
+            uuid, session = self.__bind(session_context)
+            if session is not None:
+                session._on_session_created()
+        except Exception as e:
+            self._logger.error(e)
+
+    def on_session_destroyed(self, session_context):
+        """called when a bokeh server session is destroyed (e.g. browser tab closed)"""
+        with self._lock:
+            session = self._bokeh_sessions.pop(session_context.id, None)
+        if session is not None:
+            try:
+                session._on_session_destroyed()
+            except Exception as e:
+                self._logger.error(e)
+
+
 # ------------------------------------------------------------------------------
 class BokehSession(object):
     
@@ -87,10 +281,55 @@ class BokehSession(object):
         self._callback_id = None
         # periodic callback period in seconds - defaults to None (i.e. disabled)
         self._callback_period = None
+        # actual period of the periodic callback when it has to run faster than callback_period (see _set_tick_period)
+        self._tick_period = None
         # periodic activity enabled?
         self._suspended = True
         # is this session closed?
         self._closed = False
+        # backpressure: max. num. of periodic updates the client can lag behind (opt-in: None means disabled)
+        self._max_in_flight_updates = None
+        # backpressure: sequence number of the last periodic update & last one acknowledged by the client
+        self._seq = 0
+        self._ack = 0
+        self._seq_time = 0.
+        # backpressure: num. of changes of the document (i.e. of messages to the client) - see __notify_update
+        self._doc_changes = 0
+        # backpressure: the (hidden) data source through which the client acknowledges the updates
+        self._ack_cds = None
+        # backpressure: num. of periodic updates skipped because the client was lagging
+        self._skipped_updates = 0
+        # tick guard: num. of ticks missed because the IOLoop was busy (e.g. the previous tick overran its period)
+        self._overruns = 0
+        # tick guard: smoothed tick duration & interval between ticks (in seconds), start time of the last tick
+        self._tick_duration = None
+        self._tick_interval = None
+        self._last_tick = None
+        # tick guard: automatically stretch the period on overruns? current stretched period (None means none)
+        self._auto_stretch = False
+        self._stretched_period = None
+        # actual period of the registered periodic callback (in seconds)
+        self._registered_period = None
+        # num. of connected clients (i.e. bokeh server sessions bound to this session)
+        self._clients = 0
+        # suspended because the last client disconnected? (i.e. to be resumed when a client reconnects)
+        self._suspended_without_client = False
+        # period (in seconds) of the periodic callback while no client is connected (None means fully suspended)
+        self._keep_warm_period = None
+        self._keep_warm_callback = None
+        # visibility: report which models are visible in the browser viewport? (opt-in - see is_visible)
+        self._visibility_tracking = False
+        # visibility: the (hidden) data source through which the client reports the visibility of the models
+        self._visibility_cds = None
+        # visibility: roots the client observes & names of their models, has the client reported? time of the last
+        # probe (the client is probed - at most once per second - until it reports)
+        self._visibility_roots = None
+        self._visibility_names = None
+        self._visibility_reported = False
+        self._visibility_probe_time = 0.
+        # visibility: model name -> visible in the viewport, is the browser page hidden?
+        self._visible_models = dict()
+        self._page_hidden = False
         # close existing session: this is a way to avoid leaks & resources waste
         if uuid is not None:
             self.__close_existing_session()
@@ -116,7 +355,54 @@ class BokehSession(object):
                 except Exception as e:
                     self._session_logger.error(e)
 
+    def _on_session_created(self):
+        """called by the BokehServer when a client connects to this session"""
+        self._clients += 1
+        self.__stop_keep_warm()
+
     def _on_session_destroyed(self):
+        """called by the BokehServer when a client disconnects from this session"""
+        self._clients = max(0, self._clients - 1)
+        if self._clients:
+            return
+        # the document (and its callbacks) died with the last bokeh server session: never touch it again
+        self._doc = None
+        self._callback_id = None
+        self._ack_cds = None
+        self._visibility_cds = None
+        if self._closed or self._suspended:
+            return
+        # nobody is watching: stop polling the devices (optionally keep them warm at a reduced rate)
+        self._session_logger.debug("BokehSession: no client left, suspending session {}".format(self.uuid[-5:]))
+        self.pause()
+        self._suspended_without_client = True
+        self.__start_keep_warm()
+
+    def __start_keep_warm(self):
+        self.__stop_keep_warm()
+        if self._keep_warm_period is None or not self._suspended_without_client:
+            return
+        # there's no document anymore: run on the IOLoop (see keep_warm)
+        from tornado.ioloop import PeriodicCallback
+        self._keep_warm_callback = PeriodicCallback(self.__keep_warm, max(100, int(1000. * self._keep_warm_period)))
+        self._keep_warm_callback.start()
+
+    def __stop_keep_warm(self):
+        if self._keep_warm_callback is not None:
+            self._keep_warm_callback.stop()
+            self._keep_warm_callback = None
+
+    def __keep_warm(self):
+        try:
+            self.keep_warm()
+        except Exception as e:
+            self._session_logger.error(e)
+
+    def keep_warm(self):
+        """called every keep_warm_period while no client is connected (default impl. does nothing)
+
+        there's no bokeh document at that time: must not touch any bokeh model (e.g. only poll the data sources)
+        """
         pass
 
     @property
@@ -129,7 +415,7 @@ class BokehSession(object):
 
     @property
     def server(self):
-        return self._server_info['server']
+        return self._server_info.get('server', None)
 
     @property
     def document(self):
@@ -137,7 +423,12 @@ class BokehSession(object):
 
     @property
     def bokeh_session(self):
-        return self._server_info['server'].get_sessions('/')[0]
+        if not self.server or not self._doc:
+            return None
+        for s in self.server.get_sessions('/'):
+            if s.id == self.bokeh_session_id:
+                return s
+        return None
 
     @property
     def bokeh_session_id(self):
@@ -164,9 +455,114 @@ class BokehSession(object):
     def callback_period(self, ucbp):
         """set the (periodic) callback period in seconds or None to disable the callback"""
         self._callback_period = max(0.1, ucbp) if ucbp is not None else None
+
+    @property
+    def max_in_flight_updates(self):
+        """return the max. num. of periodic updates the client can lag behind or None (i.e. no backpressure)"""
+        return self._max_in_flight_updates
+
+    @max_in_flight_updates.setter
+    def max_in_flight_updates(self, mifu):
+        """set the max. num. of periodic updates the client can lag behind or None to disable backpressure"""
+        self._max_in_flight_updates = max(1, int(mifu)) if mifu is not None else None
+        if self._max_in_flight_updates is not None and self._ack_cds is None and self.ready:
+            self.safe_document_modifications(self.__enable_backpressure)
+
+    def __enable_backpressure(self):
+        if self._ack_cds is None and self.ready:
+            self.__setup_backpressure(self._doc)
+
+    @property
+    def in_flight_updates(self):
+        """return the num. of periodic updates not yet acknowledged by the client"""
+        return self._seq - self._ack
+
+    @property
+    def skipped_updates(self):
+        """return the num. of periodic updates skipped because the client was lagging"""
+        return self._skipped_updates
+
+    @property
+    def overruns(self):
+        """return the num. of periodic callbacks missed because the IOLoop was busy (e.g. previous tick too long)"""
+        return self._overruns
+
+    @property
+    def achieved_rate(self):
+        """return the actual (smoothed) rate of the periodic callback in Hz or None if unknown"""
+        return 1. / self._tick_interval if self._tick_interval else None
+
+    @property
+    def tick_duration(self):
+        """return the (smoothed) duration of the periodic callback in seconds or None if unknown"""
+        return self._tick_duration
+
+    @property
+    def clients(self):
+        """return the num. of clients (i.e. browser views) currently connected to the session"""
+        return self._clients
+
+    @property
+    def keep_warm_period(self):
+        """return the period (in seconds) of the periodic callback while no client is connected or None"""
+        return self._keep_warm_period
+
+    @keep_warm_period.setter
+    def keep_warm_period(self, kwp):
+        """set the period (in seconds) of the periodic callback while no client is connected - None to disable"""
+        self._keep_warm_period = max(0.1, kwp) if kwp is not None else None
+        if self._suspended_without_client:
+            self.__start_keep_warm()
+
+    @property
+    def visibility_tracking(self):
+        """return True if the client reports which models are visible in the browser viewport"""
+        return self._visibility_tracking
+
+    @visibility_tracking.setter
+    def visibility_tracking(self, enabled):
+        """enable/disable the visibility tracking - when disabled, every model is considered visible"""
+        self._visibility_tracking = bool(enabled)
+        self._visibility_roots = None
+        self._visibility_reported = False
+        self._visible_models = dict()
+        self._page_hidden = False
+        if self._visibility_tracking and self._visibility_cds is None and self.ready:
+            self.safe_document_modifications(self.__enable_visibility_tracking)
+
+    def __enable_visibility_tracking(self):
+        if self._visibility_cds is None and self.ready:
+            self.__setup_visibility_tracking(self._doc)
+
+    @property
+    def page_hidden(self):
+        """return True if the browser page (tab) displaying the session is hidden (as reported by the client)"""
+        return self._visibility_tracking and self._page_hidden
+
+    def is_visible(self, name):
+        """return False if the model with the specified name is known to be out of the browser viewport (or if the
+        page is hidden), return True otherwise (including when the visibility is unknown)"""
+        if not self._visibility_tracking:
+            return True
+        if self._page_hidden:
+            return False
+        return self._visible_models.get(name, True)
+
+    @property
+    def auto_stretch(self):
+        """return True if the period is automatically stretched when the periodic callback overruns"""
+        return self._auto_stretch
+
+    @auto_stretch.setter
+    def auto_stretch(self, enabled):
+        """enable/disable the automatic stretching of the period when the periodic callback overruns"""
+        self._auto_stretch = bool(enabled)
+        if not self._auto_stretch and self._stretched_period is not None:
+            self.__stretch_period(None)
     
     def open(self):
         """open the session"""
+        inject_bokeh_resources()
         self.__open()
 
     def close(self, async=True):
@@ -177,7 +573,7 @@ class BokehSession(object):
         """cleanup the session"""
         # TODO: async cleanup required but might not be safe!
         self.pause()
-        if async:
+        if async and self.ready:
             self.safe_document_modifications(self.__cleanup)
         else:
             self.__cleanup()
@@ -224,11 +620,15 @@ class BokehSession(object):
         """suspend the (periodic) callback"""
         self.__set_callback_period(None)
         self._suspended = True
+        self._suspended_without_client = False
+        self.__stop_keep_warm()
 
     def resume(self):
         """resume the (periodic) callback"""
         self.__set_callback_period(self.callback_period)
         self._suspended = False
+        self._suspended_without_client = False
+        self.__stop_keep_warm()
 
     def update_callback_period(self, cbp):
         self.callback_period = cbp
@@ -236,18 +636,240 @@ class BokehSession(object):
 
     def __set_callback_period(self, cbp):
         try:
-            self.document.remove_periodic_callback(self._callback_id)
+            if self._doc is not None and self._callback_id is not None:
+                self._doc.remove_periodic_callback(self._callback_id)
         except:
             pass
         finally:
             self._callback_id = None
-        if cbp is not None:
-            self._callback_id = self.document.add_periodic_callback(self.periodic_callback, max(100, int(1000. * cbp)))
+            self._registered_period = None
+            self._last_tick = None
+        if cbp is not None and self._doc is not None:
+            cbp = min(cbp, self._tick_period) if self._tick_period is not None else cbp
+            cbp = max(cbp, self._stretched_period) if self._stretched_period is not None else cbp
+            self._registered_period = max(0.1, cbp)
+            self._callback_id = self.document.add_periodic_callback(self.__periodic_callback, max(100, int(1000. * cbp)))
+
+    def _set_tick_period(self, tick_period):
+        """let the periodic callback run faster than callback_period (e.g. per data stream update periods)"""
+        if tick_period == self._tick_period:
+            return
+        self._tick_period = tick_period
+        if not self._suspended and self.ready:
+            self.__set_callback_period(self.callback_period)
+
+    def __periodic_callback(self):
+        t0 = time.time()
+        if self._last_tick is not None:
+            dt = t0 - self._last_tick
+            self._tick_interval = dt if self._tick_interval is None else 0.8 * self._tick_interval + 0.2 * dt
+            # ticks run on the IOLoop thread, one at a time: a busy IOLoop shows up as missed ticks (tornado skips
+            # the runs that are overdue rather than queuing them)
+            if self._registered_period:
+                self._overruns += max(0, int(round(dt / self._registered_period)) - 1)
+        self._last_tick = t0
+        # latest frame wins: while the client lags behind, skip the update (i.e. drop the intermediate frames)
+        if self.__client_is_lagging():
+            self._skipped_updates += 1
+            return
+        try:
+            self.__probe_visibility()
+            doc_changes = self._doc_changes
+            self.periodic_callback()
+            if self._doc_changes != doc_changes:
+                # only ticks that actually changed the document are acknowledged (no extra message otherwise)
+                self.__notify_update()
+        finally:
+            self.__on_tick_done(time.time() - t0)
+
+    def __on_tick_done(self, duration):
+        td = self._tick_duration
+        self._tick_duration = duration if td is None else 0.8 * td + 0.2 * duration
+        period = self._registered_period
+        if period is None:
+            return
+        if not self._auto_stretch:
+            return
+        if duration > period:
+            # leave the IOLoop some room (websocket, user interactions, ...)
+            self.__stretch_period(1.25 * duration)
+        elif self._stretched_period is not None and self._tick_duration < 0.5 * self._stretched_period:
+            # back toward the requested period
+            shrunk = 0.8 * self._stretched_period
+            self.__stretch_period(shrunk if shrunk > 1.25 * self._tick_duration else None)
+
+    def __stretch_period(self, stretched_period):
+        if stretched_period is not None and self._callback_period is not None:
+            requested = self._callback_period
+            requested = min(requested, self._tick_period) if self._tick_period is not None else requested
+            if stretched_period <= requested:
+                stretched_period = None
+        previous = self._stretched_period
+        if stretched_period is None and previous is None:
+            return
+        if stretched_period is not None and previous is not None:
+            if abs(stretched_period - previous) < 0.1 * previous:
+                # not worth re-registering the periodic callback
+                return
+        self._stretched_period = stretched_period
+        if not self._suspended and self.ready:
+            self.__set_callback_period(self.callback_period)
+
+    def __client_is_lagging(self):
+        if self._max_in_flight_updates is None or self._ack_cds is None:
+            return False
+        if self._seq - self._ack < self._max_in_flight_updates:
+            return False
+        # don't wait forever for an acknowledgement that might never come
+        ack_timeout = max(1., 4. * (self._callback_period or 0.))
+        return time.time() - self._seq_time < ack_timeout
+
+    def __notify_update(self):
+        # the client acknowledges the update once it has applied it (and consequently every change preceding it)
+        if self._ack_cds is not None:
+            self._seq += 1
+            self._seq_time = time.time()
+            self._ack_cds.data.update(seq=[self._seq])
+
+    def __setup_backpressure(self, doc):
+        self._seq, self._ack = 0, 0
+        doc.on_change(self.__on_document_change)
+        self._ack_cds = ColumnDataSource(data=dict(seq=[0], ack=[0]), name='ack-{}'.format(self._uuid))
+        self._ack_cds.js_on_change('data', CustomJS(args=dict(cds=self._ack_cds), code="""
+            var seq = cds.data['seq'][0]
+            if (cds.data['ack'][0] != seq) {
+                cds.data = {'seq': [seq], 'ack': [seq]}
+            }
+        """))
+        self._ack_cds.on_change('data', self.__on_update_acknowledged)
+        doc.add_root(self._ack_cds)
+
+    def __setup_visibility_tracking(self, doc):
+        self._visibility_roots = None
+        self._visibility_names = None
+        self._visibility_reported = False
+        self._visibility_probe_time = 0.
+        self._visible_models = dict()
+        self._page_hidden = False
+        self._visibility_cds = ColumnDataSource(data=dict(name=[], visible=[], hidden=[]),
+                                                name='visibility-{}'.format(self._uuid))
+        # (re)installed on the client each time the server changes the tags (i.e. probes the client)
+        self._visibility_cds.js_on_change('tags', CustomJS(args=dict(cds=self._visibility_cds), code="""
+            if (cds._vt_observer) {
+                cds._vt_observer.disconnect()
+            }
+            if (cds._vt_listener) {
+                document.removeEventListener('visibilitychange', cds._vt_listener)
+            }
+            var names = cds.tags.slice(1)
+            var visible = {}
+            var report = function() {
+                var v = [], h = []
+                for (var i = 0; i < names.length; i++) {
+                    v.push(visible[names[i]] === undefined ? true : visible[names[i]])
+                    h.push(document.hidden ? true : false)
+                }
+                cds.data = {'name': names, 'visible': v, 'hidden': h}
+            }
+            var observed = []
+            var walk = function(view) {
+                if (!view) {
+                    return
+                }
+                if (view.model && view.el && names.indexOf(view.model.name) >= 0) {
+                    view.el._vt_name = view.model.name
+                    observed.push(view.el)
+                }
+                var cv = view.child_views || {}
+                for (var k in cv) {
+                    walk(cv[k])
+                }
+            }
+            try {
+                // private BokehJS API: when unavailable, nothing is observed (i.e. everything is reported visible)
+                var index = (typeof Bokeh !== 'undefined' && Bokeh.index) ? Bokeh.index : {}
+                for (var id in index) {
+                    walk(index[id])
+                }
+            }
+            catch (e) {
+                observed = []
+            }
+            if (typeof IntersectionObserver !== 'undefined') {
+                cds._vt_observer = new IntersectionObserver(function(entries) {
+                    for (var i = 0; i < entries.length; i++) {
+                        visible[entries[i].target._vt_name] = entries[i].isIntersecting
+                    }
+                    report()
+                })
+                for (var i = 0; i < observed.length; i++) {
+                    cds._vt_observer.observe(observed[i])
+                }
+            }
+            cds._vt_listener = report
+            document.addEventListener('visibilitychange', report)
+            report()
+        """))
+        self._visibility_cds.on_change('data', self.__on_visibility_reported)
+        doc.add_root(self._visibility_cds)
+
+    def __probe_visibility(self):
+        if not self._visibility_tracking or self._visibility_cds is None or not self.ready:
+            return
+        roots = tuple([r.id for r in self._doc.roots])
+        if roots != self._visibility_roots:
+            # new models: the client has to observe them
+            self._visibility_roots = roots
+            self._visibility_names = None
+            self._visibility_reported = False
+        if self._visibility_reported:
+            return
+        now = time.time()
+        if now - self._visibility_probe_time < 1.:
+            return
+        self._visibility_probe_time = now
+        if self._visibility_names is None:
+            names = set()
+            for root in self._doc.roots:
+                for model in root.references():
+                    if isinstance(model, LayoutDOM) and model.name:
+                        names.add(model.name)
+            self._visibility_names = sorted(names)
+        # the first tag is a counter that makes each probe a change (i.e. triggers the client side callback)
+        probe = self._visibility_cds.tags[0] + 1 if self._visibility_cds.tags else 1
+        self._visibility_cds.tags = [probe] + self._visibility_names
+
+    def __on_visibility_reported(self, attr, old, new):
+        try:
+            self._visible_models = dict(zip(new['name'], [bool(v) for v in new['visible']]))
+            self._page_hidden = bool(new['hidden'][0]) if len(new['hidden']) else False
+            self._visibility_reported = True
+        except Exception:
+            pass
+
+    def __on_document_change(self, event):
+        self._doc_changes += 1
+
+    def __on_update_acknowledged(self, attr, old, new):
+        try:
+            self._ack = max(self._ack, int(new['ack'][0]))
+        except Exception:
+            pass
 
     def timeout_callback(self, cb, tmo):
-        """call the specified callback after expiration of the specified timeout (in seconds)"""
+        """call the specified callback after expiration of the specified timeout (in seconds) - returns a handle"""
         if self.ready:
-            self._doc.add_timeout_callback(cb, int(1000. * tmo))
+            return self._doc.add_timeout_callback(cb, int(1000. * tmo))
+        return None
+
+    def remove_timeout_callback(self, handle):
+        """cancel the timeout callback associated with the specified handle (see timeout_callback)"""
+        if self.ready and handle is not None:
+            try:
+                self._doc.remove_timeout_callback(handle)
+            except (KeyError, ValueError):
+                # already called or removed
+                pass
 
     def safe_document_modifications(self, cb):
         """call the specified callback in the a context in which the session document is locked"""
@@ -258,9 +880,15 @@ class BokehSession(object):
         return "BokehSession:{}:{}".format(self._uuid, ('closed' if self._closed else 'opened'))
     
     def __open(self):
-        self._session_logger.debug("BokehSession.__open.spawning server for session {}".format(self.uuid[-5:]))
-        self.__spawn_server()
-        script = server_document(url=self._server_info['server_url'])
+        self._session_logger.debug("BokehSession.__open.registering session {}".format(self.uuid[-5:]))
+        bks = BokehServer.instance()
+        arguments = bks.add_session(self)
+        self._server_info['server'] = bks.server
+        # per session id: clearing this output must not stop the server shared with the other sessions
+        self._server_info['server_id'] = uuid4().hex
+        curstate().uuid_to_server[self._server_info['server_id']] = BokehSessionServerProxy(self)
+        self._server_info['server_url'] = bks.url
+        script = server_document(url=self._server_info['server_url'], arguments=arguments)
         if get_jupyter_context() == JupyterContext.LAB:
             self._session_logger.info("BokehSession.open_session:running in JupyterContext.LAB")
             data = {HTML_MIME_TYPE: script, EXEC_MIME_TYPE: ""}
@@ -269,27 +897,26 @@ class BokehSession(object):
         else:
             self._session_logger.info("BokehSession.open_session:running in JupyterContext.NOTEBOOK")
             display(HTML(script))
-        self._session_logger.debug("BokehSession.open_session.server spawn for session {}".format(self.uuid[-5:]))
-  
-    def __spawn_server(self):
-        bslg = logging.getLogger('bokeh.server.util')
-        bsll = bslg.getEffectiveLevel()
-        bslg.setLevel(logging.ERROR) 
-        self._server_info['application'] = app = Application(FunctionHandler(self.__entry_point))
-        app.add(BokehSessionHandler())
-        self._server_info['server'] = srv = Server({'/': app}, io_loop=IOLoop.instance(), port=0, allow_websocket_origin=['*'])
-        self._server_info['server_id'] = srv_id = uuid4().hex
-        curstate().uuid_to_server[srv_id] = srv
-        srv_addr = srv.address if srv.address else socket.gethostbyname(socket.gethostname())
-        self._server_info['server_url'] = 'http://{}:{}/'.format(srv_addr, srv.port)
-        srv.start()
-        bslg.setLevel(bsll)
-    
-    def __entry_point(self, doc):
+        self._session_logger.debug("BokehSession.open_session.session {} registered".format(self.uuid[-5:]))
+
+    def _attach_document(self, doc):
+        """called by the BokehServer when a document is created for this session"""
         try:
             self._session_logger.debug("BokehSession.entry_point << for session {}".format(self.uuid[-5:]))
             self._doc = doc
             self.setup_document()
+            self._ack_cds = None
+            if self._max_in_flight_updates is not None:
+                self.__setup_backpressure(doc)
+            self._visibility_cds = None
+            if self._visibility_tracking:
+                self.__setup_visibility_tracking(doc)
+            if self._suspended_without_client and self._suspended:
+                # a client reconnected: resume the activity suspended when the last one disconnected
+                self.resume()
+            elif not self._suspended and self._callback_id is None:
+                # resumed while there was no document
+                self.__set_callback_period(self.callback_period)
             self._session_logger.debug("BokehSession.entry_point >> for session {}".format(self.uuid[-5:]))
         except Exception as e:
             self._session_logger.error(e)
@@ -300,11 +927,9 @@ class BokehSession(object):
         # TODO: how to release every single resource associated with the session?
         self._session_logger.debug("BokehSession.closing session {}".format(self.uuid))
         if self.server:
-            try:
-                self.server.stop()
-            except AssertionError as e:
-                # ignore bokeh "already stopped" error
-                pass
+            # the server is shared by all the sessions: only unregister this one
+            BokehServer.instance().remove_session(self)
+        curstate().uuid_to_server.pop(self._server_info.get('server_id', None), None)
      
     @staticmethod
     def close_all():
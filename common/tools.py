@@ -18,6 +18,8 @@
 # ===========================================================================
 
 from __future__ import print_function
+import heapq
+import itertools
 import os
 import sys
 import time
@@ -102,6 +104,88 @@ class timer(object):
         self.logger.debug("op.{} took: {:.2f} ms".format(self.name, dt))
 
 
+# ------------------------------------------------------------------------------
+def import_time(module_name, runs=3, max_time=None):
+    """returns the best time (in seconds) it takes to import the specified module in a fresh interpreter
+
+    raises a RuntimeError if max_time is exceeded (see the common.check_import_time script)
+    """
+    import subprocess
+    code = "import time; t0 = time.time(); import {}; print(time.time() - t0)".format(module_name)
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+    for _ in range(max(1, int(runs))):
+        out = subprocess.check_output([sys.executable, '-c', code], cwd=cwd)
+        dt = float(out.decode('utf-8').strip().splitlines()[-1])
+        best = dt if best is None else min(best, dt)
+    if max_time is not None and best > max_time:
+        raise RuntimeError("importing {} took {:.3f} s (max. expected: {:.3f} s)".format(module_name, best, max_time))
+    return best
+
+
+# ------------------------------------------------------------------------------
+class PeriodicScheduler(object):
+    """heap based scheduler of periodic tasks, each one running at its own period
+
+    drift compensation: the next deadline of a task is computed from its previous deadline (not from the time it
+    actually ran) so that timing errors don't accumulate - a task late by more than one period skips the missed
+    runs instead of running several times in a row
+    """
+
+    def __init__(self):
+        # heap of (deadline, sequence number, key)
+        self._heap = list()
+        self._seq = itertools.count()
+        # key -> (period, task)
+        self._tasks = dict()
+
+    def __len__(self):
+        return len(self._tasks)
+
+    @property
+    def min_period(self):
+        """returns the smallest task period or None if there's no task"""
+        return min([period for period, _ in self._tasks.values()]) if self._tasks else None
+
+    def add(self, key, period, task, now=None):
+        """schedule the specified callable every 'period' seconds - first run asap (i.e. on next call to run_due)"""
+        if period is None or period <= 0.:
+            raise ValueError("invalid period for task {}: {}".format(key, period))
+        self._tasks[key] = (float(period), task)
+        heapq.heappush(self._heap, (time.time() if now is None else now, next(self._seq), key))
+
+    def remove(self, key):
+        # the heap entry is discarded lazily (see run_due)
+        self._tasks.pop(key, None)
+
+    def clear(self):
+        self._heap = list()
+        self._tasks = dict()
+
+    def run_due(self, now=None, tolerance=0.):
+        """run the tasks whose deadline is reached (minus the specified tolerance) - returns the num. of tasks run"""
+        now = time.time() if now is None else now
+        num_runs = 0
+        rescheduled = list()
+        while self._heap and self._heap[0][0] - tolerance <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            try:
+                period, task = self._tasks[key]
+            except KeyError:
+                # removed task
+                continue
+            try:
+                task()
+            finally:
+                num_runs += 1
+                # next deadline on the original time grid (skipping the missed ones if any)
+                missed = int((now - deadline) // period) if now > deadline else 0
+                rescheduled.append((deadline + (missed + 1) * period, next(self._seq), key))
+        for entry in rescheduled:
+            heapq.heappush(self._heap, entry)
+        return num_runs
+
+
 # ------------------------------------------------------------------------------
 def tracer(fn):
     
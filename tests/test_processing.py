@@ -0,0 +1,54 @@
+# ===========================================================================
+#  This file is part of the Tango Ecosystem
+#
+#  Copyright 2017-EOT Synchrotron SOLEIL, St.Aubin, France
+#
+#  This is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Lesser General Public License as published by the Free
+#  Software Foundation, either version 3 of the License, or (at your option)
+#  any later version.
+#
+#  This is distributed in the hope that it will be useful, but WITHOUT ANY
+#  WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for
+#  more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with This.  If not, see <http://www.gnu.org/licenses/>.
+# ===========================================================================
+
+import numpy as np
+
+from common.processing import RgbaColorMapper, TileDeltaEncoder
+
+
+# ------------------------------------------------------------------------------
+def test_tile_delta_full_refresh_returns_a_new_array():
+    # the consumer (e.g. a ColumnDataSource) only notices a new array object
+    for owned in (False, True):
+        tde = TileDeltaEncoder(tile_size=4, full_refresh_period=10, max_dirty_ratio=0.5)
+        full_refresh, first = tde.encode(np.zeros((16, 16)), owned)
+        assert full_refresh
+        full_refresh, second = tde.encode(np.ones((16, 16)), owned)
+        assert full_refresh
+        assert second is not first
+        assert np.all(first == 0.) and np.all(second == 1.)
+
+
+def test_tile_delta_dirty_tiles():
+    tde = TileDeltaEncoder(tile_size=4, full_refresh_period=10, max_dirty_ratio=0.5)
+    image = np.zeros((16, 16))
+    tde.encode(image)
+    image = image.copy()
+    image[5, 9] = 1.
+    full_refresh, tiles = tde.encode(image)
+    assert not full_refresh
+    assert tiles == [(4, 8, 8, 12)]
+
+
+def test_rgba_color_mapper_matches_bokeh_binning():
+    # bokeh's LinearColorMapper: 2 colors on [0, 1] -> [0, 0.5) is black, [0.5, 1] is white
+    mapper = RgbaColorMapper(['#000000', '#ffffff'], 0., 1.)
+    black, white = mapper.lut(['#000000', '#ffffff'])[:2]
+    rgba = mapper.map(np.array([[0., 0.4, 0.6, 0.99, 1., 2., -1.]]))
+    assert list(rgba[0]) == [black, black, white, white, white, white, black]